@@ -1,12 +1,41 @@
 import os
+import weakref
 import chromadb
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# HNSW tiers by projected collection size: (max vectors, M, construction_ef, search_ef)
+HNSW_TIERS = [
+    (10_000, 16, 128, 40),
+    (1_000_000, 24, 128, 100),
+    (None, 32, 200, 200)
+]
+# Embeddings are L2-normalized when generated, so inner product equals cosine similarity
+HNSW_DEFAULT_SPACE = "ip"
+
+def configure_hnsw_params(vector_count: Optional[int] = None) -> Dict[str, object]:
+    """
+    Build HNSW collection metadata for the projected collection size.
+    An unknown size gets the middle tier. CHROMA_HNSW_M, CHROMA_HNSW_CONSTRUCTION_EF,
+    CHROMA_HNSW_SEARCH_EF and CHROMA_HNSW_SPACE override the tuned values.
+    """
+    if vector_count is None:
+        _, m, construction_ef, search_ef = HNSW_TIERS[1]
+    else:
+        for max_vectors, m, construction_ef, search_ef in HNSW_TIERS:
+            if max_vectors is None or vector_count <= max_vectors:
+                break
+    return {
+        "hnsw:space": os.getenv("CHROMA_HNSW_SPACE", HNSW_DEFAULT_SPACE),
+        "hnsw:M": int(os.getenv("CHROMA_HNSW_M", m)),
+        "hnsw:construction_ef": int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", construction_ef)),
+        "hnsw:search_ef": int(os.getenv("CHROMA_HNSW_SEARCH_EF", search_ef))
+    }
+
 class ChromaDBManager:
     def __init__(self, persist_directory: str = "./ChromaDB"):
         """
@@ -17,6 +46,8 @@ class ChromaDBManager:
         """
         self.persist_directory = persist_directory
         self.client = None
+        # Called with a chat_id whenever its collection is deleted or (re)created
+        self._collection_listeners = []
         self._ensure_directory_exists()
         self._initialize_client()
     
@@ -41,12 +72,13 @@ class ChromaDBManager:
             logger.error(f"Error initializing ChromaDB client: {str(e)}")
             raise
     
-    def create_collection(self, chat_id: str) -> Dict[str, str]:
+    def create_collection(self, chat_id: str, expected_size: Optional[int] = None) -> Dict[str, str]:
         """
         Create a new collection for a specific chat ID
         
         Args:
             chat_id (str): Unique identifier for the chat
+            expected_size (int, optional): Projected number of vectors, used to tune HNSW
             
         Returns:
             Dict[str, str]: Success/error message with status
@@ -62,9 +94,12 @@ class ChromaDBManager:
             if chat_id in collection_names:
                 return {"status": "warning", "message": f"Collection '{chat_id}' already exists."}
             
-            # Create new collection
-            collection = self.client.create_collection(name=chat_id)
+            # Create new collection; HNSW graph parameters are fixed at creation
+            collection = self.client.create_collection(
+                name=chat_id, metadata=configure_hnsw_params(expected_size)
+            )
             logger.info(f"Created collection: {chat_id}")
+            self._notify_collection_changed(chat_id)
             
             return {
                 "status": "success", 
@@ -100,6 +135,7 @@ class ChromaDBManager:
             # Delete collection
             self.client.delete_collection(name=chat_id)
             logger.info(f"Deleted collection: {chat_id}")
+            self._notify_collection_changed(chat_id)
             
             return {
                 "status": "success", 
@@ -111,6 +147,47 @@ class ChromaDBManager:
             logger.error(f"Error deleting collection '{chat_id}': {str(e)}")
             return {"status": "error", "message": f"Failed to delete collection: {str(e)}"}
     
+    def add_collection_listener(self, callback: Callable[[str], None]) -> None:
+        """
+        Register a bound method to call with the chat_id of a deleted or created collection
+        
+        Args:
+            callback (Callable[[str], None]): Bound method; held weakly so its owner can be collected
+        """
+        self._collection_listeners.append(weakref.WeakMethod(callback))
+    
+    def _notify_collection_changed(self, chat_id: str) -> None:
+        """Tell registered listeners that a collection's contents were replaced"""
+        for ref in self._collection_listeners[:]:
+            callback = ref()
+            if callback is None:
+                self._collection_listeners.remove(ref)
+            else:
+                callback(chat_id)
+    
+    def tune_search_ef(self, collection, vector_count: int) -> Optional[int]:
+        """
+        Set a collection's HNSW ef_search to the tier for its current size
+        
+        Args:
+            collection: ChromaDB collection object
+            vector_count (int): Number of vectors currently in the collection
+            
+        Returns:
+            Optional[int]: The ef_search value now in effect, or None if the update failed
+        """
+        search_ef = configure_hnsw_params(vector_count)["hnsw:search_ef"]
+        try:
+            current = (collection.configuration_json or {}).get("hnsw", {}).get("ef_search")
+            if current != search_ef:
+                collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+                logger.info(f"Set ef_search={search_ef} for collection '{collection.name}' ({vector_count} vectors)")
+            return search_ef
+        except Exception as e:
+            # Tuning is an optimization; the query can still run with the current setting
+            logger.warning(f"Could not set ef_search for collection '{collection.name}': {str(e)}")
+            return None
+    
     def get_collection(self, chat_id: str) -> Optional[object]:
         """
         Get a collection by chat ID
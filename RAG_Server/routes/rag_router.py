@@ -3,7 +3,7 @@ import asyncio
 import base64
 from typing import Dict, List, Any
 from utils.langgraph_workflow import create_rag_workflow
-from utils.logger_utils import setup_langgraph_logger
+from utils.logger_utils import read_chat_log, setup_langgraph_logger
 import logging
 
 # Create blueprint for RAG operations
@@ -210,28 +210,20 @@ def get_logs(chat_id: str):
     Get processing logs for a specific chat ID
     """
     try:
-        import os
-        from pathlib import Path
+        chat_log = read_chat_log(chat_id)
         
-        logs_dir = Path("./logs")
-        log_files = list(logs_dir.glob(f"langgraph_{chat_id}_*.txt"))
-        
-        if not log_files:
+        if chat_log is None:
             return jsonify({
                 "status": "error",
                 "message": f"No logs found for chat_id: {chat_id}"
             }), 404
         
-        # Get the most recent log file
-        latest_log = max(log_files, key=os.path.getctime)
-        
-        with open(latest_log, 'r', encoding='utf-8') as f:
-            log_content = f.read()
+        log_file_name, log_content = chat_log
         
         return jsonify({
             "status": "success",
             "chat_id": chat_id,
-            "log_file": latest_log.name,
+            "log_file": log_file_name,
             "log_content": log_content
         }), 200
         
@@ -14,39 +14,203 @@ Usage:
     cleaned = await manager.clean_text(text)
     chunks = await manager.chunk_text(text)
     embeddings = await manager.generate_embeddings([text])
+    async for chunk in manager.stream_document_complete(file_content, filename):
+        ...
 """
 
 import os
 import io
 import re
-import tempfile
+import time
 import asyncio
+import atexit
+import bisect
+import functools
 import logging
 import uuid
-from typing import List, Dict, Any, Optional
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from datetime import datetime
 
 # ---------------------------
 # Third-party Imports & spaCy Model
 # ---------------------------
 try:
+    import numpy as np
     import spacy
+    from spacy.attrs import IS_STOP, IS_PUNCT
+    import fitz
+    import httpx
     from langchain_community.document_loaders import PyMuPDFLoader
     from langchain_huggingface import HuggingFaceEmbeddings
     from docx import Document
     import PyPDF2
 except ImportError as e:
     print(f"Required package not installed: {e}")
-    print("Please install: pip install spacy langchain-community langchain-huggingface python-docx PyPDF2")
-
-try:
-    nlp = spacy.load('en_core_web_sm')
-except OSError:
-    print("Please install spacy English model: python -m spacy download en_core_web_sm")
-    nlp = None
+    print("Please install: pip install spacy PyMuPDF httpx langchain-community langchain-huggingface python-docx PyPDF2")
 
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=None)
+def get_nlp():
+    """Load the spaCy English model once, on first use. Returns None if unavailable."""
+    try:
+        return spacy.load('en_core_web_sm')
+    except (OSError, NameError):
+        print("Please install spacy English model: python -m spacy download en_core_web_sm")
+        return None
+
+# spaCy pipe tuning: stopword/punctuation flags are lexeme attributes, so the
+# plain tokenizer is enough there; lemmas only need the tagger/attribute_ruler.
+SPACY_BATCH_SIZE = 64
+STOPWORD_DISABLED_PIPES = ['tok2vec', 'tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'ner']
+LEMMA_DISABLED_PIPES = ['parser', 'ner']
+
+# Encoding normalization for advanced cleaning, compiled once at import
+_TRANSLATE_TABLE = str.maketrans({
+    '\u2018': "'", '\u2019': "'",
+    '\u201c': '"', '\u201d': '"',
+    '\u2013': '-', '\u2014': '-',
+    '\u00a0': ' ',
+})
+_WS_RE = re.compile(r'\s+')
+_SENTENCE_END_RE = re.compile(r'[.!?\n]')
+# Split points for intelligent chunking, in order of preference
+_CHUNK_BOUNDARY_PATTERNS = [
+    re.compile(r'\n\n+'),      # Paragraph breaks
+    re.compile(r'\. [A-Z]'),   # Sentence endings followed by capital letter
+    re.compile(r'[.!?]\s+'),   # Any sentence ending
+    re.compile(r'\n'),         # Line breaks
+    re.compile(r'[,;]\s+'),    # Clause breaks
+    re.compile(r'\s+'),        # Word boundaries
+]
+_KEEP_RE = re.compile(r'[^\w\s\.\,\!\?\;\:\-\(\)\[\]\{\}\"\'\/\\\n]')
+
+def count_tokens(text: str) -> int:
+    """
+    Count whitespace-separated words without materializing them.
+    Equivalent to len(text.split()) for ASCII whitespace.
+    """
+    if not text:
+        return 0
+    codes = np.frombuffer(text.encode('utf-8', errors='ignore'), dtype=np.uint8)
+    is_space = (codes == 0x20) | ((codes >= 0x09) & (codes <= 0x0d))
+    word_starts = np.count_nonzero(is_space[:-1] & ~is_space[1:])
+    return int(word_starts) + (0 if is_space[0] else 1)
+
+# In-memory embedding precision. ChromaDB widens whatever it receives to float32,
+# so this trades a little accuracy for half the cache and transfer footprint.
+EMBEDDING_DTYPES = {'fp32': 'float32', 'fp16': 'float16'}
+
+# Maximum number of chunk embeddings kept in each manager's LRU cache
+EMBEDDING_CACHE_SIZE = 10_000
+
+# Text Embeddings Inference server; requests are split to stay under its client batch limit
+TEI_BATCH_SIZE = 32
+TEI_TIMEOUT = 60.0
+
+# Streaming pipeline: bounded queues keep memory flat regardless of document size
+STREAM_QUEUE_SIZE = 8
+STREAM_CLEAN_BATCH = 8
+STREAM_EMBED_BATCH = 32
+
+# Dedicated pool for embedding work so it neither starves nor is starved by the default executor
+EMBED_WORKERS = 4
+_EMBED_EXECUTOR = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix='embed')
+
+# MuPDF is not thread-safe, so all PDF parsing goes through one dedicated worker
+_PDF_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pdf')
+
+# spaCy holds the GIL, so advanced cleaning runs in worker processes. The pool is
+# created on first use. The server is multi-threaded by then, so workers are not
+# forked from it (a child could inherit a lock held by another thread); each one
+# loads the spaCy model once when it starts. Every worker imports the app and holds
+# its own model, so the default is capped rather than one per core.
+CLEAN_WORKERS = int(os.getenv("RAG_CLEAN_WORKERS", min(4, os.cpu_count() or 1)))
+CLEAN_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+_CLEAN_POOL: Optional[ProcessPoolExecutor] = None
+_CLEAN_POOL_LOCK = threading.Lock()
+
+def _get_clean_pool() -> ProcessPoolExecutor:
+    """Return the shared cleaning process pool, creating it on first use."""
+    global _CLEAN_POOL
+    with _CLEAN_POOL_LOCK:
+        if _CLEAN_POOL is None:
+            _CLEAN_POOL = ProcessPoolExecutor(
+                max_workers=CLEAN_WORKERS,
+                mp_context=multiprocessing.get_context(CLEAN_START_METHOD),
+                initializer=get_nlp
+            )
+        return _CLEAN_POOL
+
+def _discard_clean_pool(pool: ProcessPoolExecutor):
+    """Drop a broken cleaning pool so the next _get_clean_pool() starts a fresh one."""
+    global _CLEAN_POOL
+    with _CLEAN_POOL_LOCK:
+        if _CLEAN_POOL is pool:
+            _CLEAN_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+async def _lemmatize_in_pool(texts: List[str]) -> List[str]:
+    """
+    Run lemmatize_filtered_texts on the cleaning pool. If a worker died and
+    broke the pool, replace the pool and retry once.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_clean_pool()
+    try:
+        return await loop.run_in_executor(pool, lemmatize_filtered_texts, texts)
+    except BrokenProcessPool:
+        logger.warning("Cleaning worker died; restarting the cleaning pool")
+        _discard_clean_pool(pool)
+        return await loop.run_in_executor(_get_clean_pool(), lemmatize_filtered_texts, texts)
+
+@atexit.register
+def _shutdown_clean_pool():
+    """Stop the cleaning workers when the interpreter exits."""
+    with _CLEAN_POOL_LOCK:
+        if _CLEAN_POOL is not None:
+            _CLEAN_POOL.shutdown(cancel_futures=True)
+
+def _content_token_indices(doc) -> List[int]:
+    """
+    Return indices of tokens that are neither stopwords nor punctuation.
+    The flags are read in one to_array call and filtered with NumPy.
+    """
+    if len(doc) == 0:
+        return []
+    flags = doc.to_array([IS_STOP, IS_PUNCT])
+    return np.flatnonzero((flags[:, 0] == 0) & (flags[:, 1] == 0)).tolist()
+
+def lemmatize_filtered_texts(texts: List[str]) -> List[str]:
+    """
+    Lemmatize texts with spaCy, dropping stopwords, punctuation and single characters.
+    Top-level so it can be sent to the cleaning process pool.
+    """
+    nlp = get_nlp()
+    disable = [name for name in LEMMA_DISABLED_PIPES if name in nlp.pipe_names]
+    cleaned_texts = []
+    for doc in nlp.pipe(texts, batch_size=SPACY_BATCH_SIZE, disable=disable):
+        cleaned_tokens = []
+        for i in _content_token_indices(doc):
+            token = doc[i]
+            if len(token.text.strip()) > 1:
+                cleaned_tokens.append(token.lemma_.lower())
+        cleaned_texts.append(" ".join(cleaned_tokens))
+    return cleaned_texts
+
+# File extension -> document type used by DocumentHandler
+DOCUMENT_TYPES = {
+    '.pdf': 'pdf',
+    '.docx': 'word',
+    '.txt': 'txt'
+}
+
 # ---------------------------
 # MustanDocumentManager Class
 # ---------------------------
@@ -54,9 +218,23 @@ class MustanDocumentManager:
     """
     Handles document extraction, cleaning, chunking, and embedding.
     """
-    def __init__(self, model_name: str = "BAAI/bge-large-en-v1.5"):
-        self.embeddings = HuggingFaceEmbeddings(model_name=model_name)
-        self.nlp_model = nlp
+    def __init__(self, model_name: str = "BAAI/bge-large-en-v1.5", tei_url: Optional[str] = None,
+                 precision: str = "fp16"):
+        if precision not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unsupported embedding precision: {precision}")
+        self.model_name = model_name
+        self.precision = precision
+        self._emb_dtype = EMBEDDING_DTYPES[precision]
+        self.tei_url = (tei_url or os.getenv("TEI_URL") or "").rstrip("/") or None
+        self._tei_client = httpx.Client(timeout=TEI_TIMEOUT) if self.tei_url else None
+        # With a TEI server configured the in-process model is only loaded as a fallback
+        self.embeddings = None if self.tei_url else HuggingFaceEmbeddings(model_name=model_name)
+        self._embeddings_lock = threading.Lock()
+        self._emb_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._emb_cache_lock = threading.Lock()
+        self._emb_cache_hits = 0
+        self._emb_cache_misses = 0
+        self.nlp_model = get_nlp()
         self.supported_formats = {
             '.pdf': 'application/pdf',
             '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
@@ -71,7 +249,7 @@ class MustanDocumentManager:
     async def extract_text_from_file(self, file_content: bytes, filename: str) -> str:
         """
         Extract text from uploaded file (PDF, DOCX, TXT).
-        Uses PyMuPDFLoader for PDFs, python-docx for DOCX, and utf-8 decode for TXT.
+        Uses PyMuPDF for PDFs, python-docx for DOCX, and utf-8 decode for TXT.
         """
         try:
             ext = os.path.splitext(filename.lower())[1]
@@ -89,38 +267,34 @@ class MustanDocumentManager:
 
     async def _extract_from_pdf_mustan(self, file_content: bytes, filename: str) -> str:
         """
-        Extract text from PDF using PyMuPDFLoader.
+        Extract text from PDF using PyMuPDF.
         Falls back to PyPDF2 if needed.
         """
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
-            try:
-                loader = PyMuPDFLoader(temp_file_path)
-                documents = loader.load()
-                text = ""
-                for doc in documents:
-                    text += doc.page_content + "\n"
-                return text.strip()
-            finally:
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                _PDF_EXECUTOR, self._read_pdf_pages, file_content
+            )
         except Exception as e:
             logger.error(f"Error extracting PDF text with PyMuPDF: {e}")
             return await self._extract_from_pdf_fallback(file_content)
 
+    @staticmethod
+    def _read_pdf_pages(file_content: bytes) -> str:
+        """
+        Read every page of an in-memory PDF with PyMuPDF and join the page texts.
+        """
+        with fitz.open(stream=file_content, filetype='pdf') as pdf:
+            return "\n".join(page.get_text() for page in pdf).strip()
+
     async def _extract_from_pdf_fallback(self, file_content: bytes) -> str:
         """
         Fallback PDF extraction using PyPDF2.
         """
         try:
-            text = ""
             pdf_file = io.BytesIO(file_content)
             pdf_reader = PyPDF2.PdfReader(pdf_file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+            return "\n".join(page.extract_text() for page in pdf_reader.pages).strip()
         except Exception as e:
             logger.error(f"Error with fallback PDF extraction: {e}")
             raise
@@ -132,10 +306,7 @@ class MustanDocumentManager:
         try:
             docx_file = io.BytesIO(file_content)
             doc = Document(docx_file)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text.strip()
+            return "\n".join(paragraph.text for paragraph in doc.paragraphs).strip()
         except Exception as e:
             logger.error(f"Error extracting DOCX text: {e}")
             raise
@@ -146,6 +317,17 @@ class MustanDocumentManager:
         """
         return [doc.page_content for doc in documents]
 
+    def _spacy_pipe(self, texts: List[str], disable: List[str]):
+        """
+        Run texts through spaCy in batches, in this process. spaCy's own
+        n_process would fork from the multi-threaded server; work that needs
+        worker processes goes through _get_clean_pool() instead.
+        """
+        disable = [name for name in disable if name in self.nlp_model.pipe_names]
+        return self.nlp_model.pipe(
+            texts, batch_size=SPACY_BATCH_SIZE, n_process=1, disable=disable
+        )
+
     def clean_text_efficiently(self, texts: List[str]) -> List[str]:
         """
         Clean text efficiently using spaCy.
@@ -156,9 +338,9 @@ class MustanDocumentManager:
             return [self._basic_clean_text(text) for text in texts]
         try:
             processed_texts = []
-            for doc in self.nlp_model.pipe(texts):
+            for doc in self._spacy_pipe(texts, STOPWORD_DISABLED_PIPES):
                 filtered_text = " ".join(
-                    token.text for token in doc if not token.is_stop and not token.is_punct
+                    [doc[i].text for i in _content_token_indices(doc)]
                 )
                 processed_texts.append(filtered_text)
             return processed_texts
@@ -186,16 +368,30 @@ class MustanDocumentManager:
         Clean single text (wrapper for efficient cleaning).
         """
         try:
-            cleaned_texts = self.clean_text_efficiently([text])
+            loop = asyncio.get_event_loop()
+            cleaned_texts = await loop.run_in_executor(
+                None, self.clean_text_efficiently, [text]
+            )
             return cleaned_texts[0] if cleaned_texts else text
         except Exception as e:
             logger.error(f"Error cleaning text: {e}")
             return text
 
+    async def clean_texts(self, texts: List[str]) -> List[str]:
+        """
+        Clean several texts with a single batched spaCy pass.
+        """
+        try:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, self.clean_text_efficiently, texts)
+        except Exception as e:
+            logger.error(f"Error cleaning texts: {e}")
+            return list(texts)
+
     async def chunk_text(self, text: str, max_chunk_size: int = 1000, overlap_size: int = 200) -> List[Dict[str, Any]]:
         """
         Split text into overlapping chunks with metadata.
-        Attempts to split at sentence boundaries.
+        Attempts to split at sentence boundaries (. ! ? or newline).
         """
         try:
             if len(text) <= max_chunk_size:
@@ -209,12 +405,14 @@ class MustanDocumentManager:
             chunks = []
             start = 0
             chunk_index = 0
+            # Offsets just past every sentence end, found in one regex scan
+            boundaries = [m.end() for m in _SENTENCE_END_RE.finditer(text)]
             while start < len(text):
                 end = start + max_chunk_size
                 if end < len(text):
-                    sentence_end = text.rfind('.', start, end)
-                    if sentence_end > start + max_chunk_size // 2:
-                        end = sentence_end + 1
+                    idx = bisect.bisect_right(boundaries, end) - 1
+                    if idx >= 0 and boundaries[idx] - 1 > start + max_chunk_size // 2:
+                        end = boundaries[idx]
                 chunk_text = text[start:end].strip()
                 if chunk_text:
                     chunks.append({
@@ -242,24 +440,147 @@ class MustanDocumentManager:
                 "end_pos": len(text)
             }]
 
-    def embedding_text(self, texts: List[str]) -> List[List[float]]:
+    def _local_embeddings(self):
+        """Return the in-process HuggingFace model, loading it on first use."""
+        if self.embeddings is None:
+            with self._embeddings_lock:
+                if self.embeddings is None:
+                    self.embeddings = HuggingFaceEmbeddings(model_name=self.model_name)
+        return self.embeddings
+
+    def _cache_lookup(self, texts: List[str]):
+        """
+        Split texts into cached embeddings and misses keyed by content hash.
+        Returns the partially filled row list and {key: [positions]} for misses.
+        """
+        keys = [hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest() for text in texts]
+        results: List[Optional["np.ndarray"]] = [None] * len(texts)
+        miss_positions: Dict[bytes, List[int]] = {}
+        with self._emb_cache_lock:
+            for i, key in enumerate(keys):
+                cached = self._emb_cache.get(key)
+                if cached is not None:
+                    self._emb_cache.move_to_end(key)
+                    results[i] = cached
+                else:
+                    miss_positions.setdefault(key, []).append(i)
+            misses = sum(len(positions) for positions in miss_positions.values())
+            self._emb_cache_hits += len(texts) - misses
+            self._emb_cache_misses += misses
+        return results, miss_positions
+
+    def embedding_cache_stats(self) -> Dict[str, int]:
+        """Return cumulative hit/miss counts and the current size of the embedding cache."""
+        with self._emb_cache_lock:
+            return {
+                "hits": self._emb_cache_hits,
+                "misses": self._emb_cache_misses,
+                "size": len(self._emb_cache)
+            }
+
+    def _cache_store(self, results: List[Optional["np.ndarray"]], miss_positions: Dict[bytes, List[int]],
+                     new_embeddings: List[List[float]]) -> "np.ndarray":
         """
-        Generate embeddings for text list using HuggingFace.
+        Scatter freshly computed embeddings into results and the LRU cache.
+        Rows are L2-normalized here, once, so collections can use inner-product distance.
+        """
+        new_matrix = np.asarray(new_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(new_matrix, axis=1, keepdims=True)
+        new_matrix = (new_matrix / np.maximum(norms, 1e-12)).astype(self._emb_dtype)
+        with self._emb_cache_lock:
+            for key, row in zip(miss_positions, new_matrix):
+                # A row view would keep the whole batch matrix alive while any row stays cached
+                embedding = row.copy()
+                for i in miss_positions[key]:
+                    results[i] = embedding
+                self._emb_cache[key] = embedding
+            while len(self._emb_cache) > EMBEDDING_CACHE_SIZE:
+                self._emb_cache.popitem(last=False)
+        return self._stack_embeddings(results)
+
+    def _stack_embeddings(self, rows: List["np.ndarray"]) -> "np.ndarray":
+        """Stack embedding rows into an (N, D) matrix of the configured precision."""
+        if not rows:
+            return np.empty((0, 0), dtype=self._emb_dtype)
+        return np.stack(rows)
+
+    def _post_tei(self, batch: List[str]) -> List[List[float]]:
+        """Send one batch to the TEI server's /embed endpoint."""
+        response = self._tei_client.post(
+            f"{self.tei_url}/embed", json={"inputs": batch, "normalize": False}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _embed_with_tei(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts through the TEI server's /embed endpoint."""
+        embeddings = []
+        for i in range(0, len(texts), TEI_BATCH_SIZE):
+            embeddings.extend(self._post_tei(texts[i:i + TEI_BATCH_SIZE]))
+        return embeddings
+
+    async def _aembed_with_tei(self, texts: List[str]) -> List[List[float]]:
+        """
+        Async TEI embedding; sub-batches are sent concurrently so the server can batch them.
+        Requests go through the manager's pooled sync client on the embedding executor,
+        since its kept-alive connections outlive the per-request event loops.
+        """
+        loop = asyncio.get_running_loop()
+        batches = await asyncio.gather(*[
+            loop.run_in_executor(_EMBED_EXECUTOR, self._post_tei, texts[i:i + TEI_BATCH_SIZE])
+            for i in range(0, len(texts), TEI_BATCH_SIZE)
+        ])
+        return [embedding for batch in batches for embedding in batch]
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with TEI when configured, falling back to the in-process model."""
+        if self.tei_url:
+            try:
+                return self._embed_with_tei(texts)
+            except Exception as e:
+                logger.warning(f"TEI embedding failed, using local model: {e}")
+        return self._local_embeddings().embed_documents(texts)
+
+    def embedding_text(self, texts: List[str]) -> "np.ndarray":
+        """
+        Generate embeddings for text list using TEI or HuggingFace.
+        Texts seen before are served from a content-hash LRU cache; only
+        misses are sent to the model. Returns an (N, D) matrix of unit-length
+        rows in the manager's precision (fp16 by default).
         """
         try:
-            return self.embeddings.embed_documents(texts)
+            results, miss_positions = self._cache_lookup(texts)
+            if not miss_positions:
+                return self._stack_embeddings(results)
+            miss_texts = [texts[positions[0]] for positions in miss_positions.values()]
+            return self._cache_store(results, miss_positions, self._embed_uncached(miss_texts))
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
             raise
 
-    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+    async def generate_embeddings(self, texts: List[str]) -> "np.ndarray":
         """
         Async wrapper for embedding generation.
+        Calls TEI natively when configured, otherwise runs the model in an executor.
         """
         try:
+            if self.tei_url:
+                results, miss_positions = self._cache_lookup(texts)
+                if not miss_positions:
+                    return self._stack_embeddings(results)
+                miss_texts = [texts[positions[0]] for positions in miss_positions.values()]
+                try:
+                    new_embeddings = await self._aembed_with_tei(miss_texts)
+                except Exception as e:
+                    logger.warning(f"TEI embedding failed, using local model: {e}")
+                    loop = asyncio.get_event_loop()
+                    new_embeddings = await loop.run_in_executor(
+                        _EMBED_EXECUTOR, lambda: self._local_embeddings().embed_documents(miss_texts)
+                    )
+                return self._cache_store(results, miss_positions, new_embeddings)
             loop = asyncio.get_event_loop()
             embeddings = await loop.run_in_executor(
-                None, self.embedding_text, texts
+                _EMBED_EXECUTOR, self.embedding_text, texts
             )
             return embeddings
         except Exception as e:
@@ -281,19 +602,20 @@ class MustanDocumentManager:
             logger.info(f"Generating embeddings for {len(chunks)} chunks from {filename}")
             chunk_texts = [chunk["text"] for chunk in chunks]
             embeddings = await self.generate_embeddings(chunk_texts)
-            processed_chunks = []
-            for i, chunk in enumerate(chunks):
-                processed_chunks.append({
-                    **chunk,
-                    "embedding": embeddings[i],
-                    "filename": filename,
-                    "file_size": len(file_content),
-                    "original_text_length": len(text),
-                    "cleaned_text_length": len(cleaned_text)
-                })
+            file_size = len(file_content)
+            original_text_length = len(text)
+            cleaned_text_length = len(cleaned_text)
+            processed_chunks = [{
+                **chunk,
+                "embedding": embedding,
+                "filename": filename,
+                "file_size": file_size,
+                "original_text_length": original_text_length,
+                "cleaned_text_length": cleaned_text_length
+            } for chunk, embedding in zip(chunks, embeddings)]
             return {
                 "filename": filename,
-                "file_size": len(file_content),
+                "file_size": file_size,
                 "original_text": text,
                 "cleaned_text": cleaned_text,
                 "total_chunks": len(processed_chunks),
@@ -314,6 +636,121 @@ class MustanDocumentManager:
                 "error": str(e)
             }
 
+    async def stream_document_complete(self, file_content: bytes, filename: str,
+                                       max_chunk_size: int = 1000, overlap_size: int = 200,
+                                       embed_batch_size: int = STREAM_EMBED_BATCH) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of process_document_complete.
+        Pages are extracted, cleaned, chunked and embedded by concurrent stages
+        connected with bounded queues, and embedded chunks are yielded as soon
+        as they are ready. Chunks never span pages; start_pos/end_pos are
+        relative to the page given by page_index.
+        """
+        done = object()
+        pages_q: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        cleaned_q: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        chunks_q: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE * embed_batch_size)
+        out_q: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE * embed_batch_size)
+        errors: List[Exception] = []
+
+        async def run_stage(body, out_queue: asyncio.Queue):
+            # Record a stage failure and still close its output so downstream stages finish
+            try:
+                await body()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                await out_queue.put(done)
+
+        async def produce():
+            async for page in self._iter_pages(file_content, filename):
+                await pages_q.put(page)
+
+        async def clean():
+            finished = False
+            while not finished:
+                batch, finished = await self._next_batch(pages_q, STREAM_CLEAN_BATCH, done)
+                if batch:
+                    cleaned_texts = await self.clean_texts([text for _, text in batch])
+                    for (page_index, _), cleaned_text in zip(batch, cleaned_texts):
+                        await cleaned_q.put((page_index, cleaned_text))
+
+        async def chunk():
+            chunk_index = 0
+            while (item := await cleaned_q.get()) is not done:
+                page_index, cleaned_text = item
+                for page_chunk in await self.chunk_text(cleaned_text, max_chunk_size, overlap_size):
+                    page_chunk.pop("total_chunks", None)
+                    await chunks_q.put({**page_chunk, "chunk_index": chunk_index, "page_index": page_index})
+                    chunk_index += 1
+
+        async def embed():
+            finished = False
+            while not finished:
+                batch, finished = await self._next_batch(chunks_q, embed_batch_size, done)
+                if batch:
+                    embeddings = await self.generate_embeddings([c["text"] for c in batch])
+                    for chunk, embedding in zip(batch, embeddings):
+                        await out_q.put({
+                            **chunk,
+                            "embedding": embedding,
+                            "filename": filename,
+                            "file_size": len(file_content)
+                        })
+
+        tasks = [
+            asyncio.ensure_future(run_stage(body, out_queue))
+            for body, out_queue in ((produce, pages_q), (clean, cleaned_q), (chunk, chunks_q), (embed, out_q))
+        ]
+        try:
+            while (item := await out_q.get()) is not done:
+                yield item
+            if errors:
+                raise errors[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _next_batch(queue: asyncio.Queue, limit: int, done: object) -> Tuple[List[Any], bool]:
+        """
+        Wait for one item, then take whatever else is already queued up to limit.
+        Returns the batch and whether the end-of-stream marker was reached.
+        """
+        batch = [await queue.get()]
+        while len(batch) < limit and batch[-1] is not done and not queue.empty():
+            batch.append(queue.get_nowait())
+        if batch[-1] is done:
+            return batch[:-1], True
+        return batch, False
+
+    async def _iter_pages(self, file_content: bytes, filename: str) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Yield (page_index, text) pairs. PDFs are read one page at a time;
+        other formats are extracted whole as a single page.
+        """
+        if os.path.splitext(filename.lower())[1] == '.pdf':
+            loop = asyncio.get_event_loop()
+            try:
+                pdf = await loop.run_in_executor(
+                    _PDF_EXECUTOR, lambda: fitz.open(stream=file_content, filetype='pdf')
+                )
+            except Exception as e:
+                logger.error(f"Error opening PDF with PyMuPDF: {e}")
+                pdf = None
+            if pdf is not None:
+                try:
+                    for page_index in range(pdf.page_count):
+                        text = await loop.run_in_executor(
+                            _PDF_EXECUTOR, lambda i=page_index: pdf.load_page(i).get_text()
+                        )
+                        yield page_index, text.strip()
+                finally:
+                    await loop.run_in_executor(_PDF_EXECUTOR, pdf.close)
+                return
+        yield 0, await self.extract_text_from_file(file_content, filename)
+
     def get_supported_formats(self) -> List[str]:
         """Get list of supported file formats."""
         return list(self.supported_formats.keys())
@@ -345,32 +782,36 @@ class MustanDocumentManager:
         Improved text cleaning with better preprocessing and normalization.
         Uses spaCy for lemmatization and stopword removal.
         """
-        try:
+        cleaned_texts = await self._sonnet_clean_texts_advanced([text])
+        return cleaned_texts[0]
+
+    async def _sonnet_clean_texts_advanced(self, texts: List[str]) -> List[str]:
+        """
+        Batched form of _sonnet_clean_text_advanced: all texts share one spaCy pipe.
+        """
+        normalized = []
+        for text in texts:
             if not text or len(text.strip()) == 0:
-                return ""
-            text = text.strip()
-            text = text.replace('\u2018', "'").replace('\u2019', "'")
-            text = text.replace('\u201c', '"').replace('\u201d', '"')
-            text = text.replace('\u2013', '-').replace('\u2014', '-')
-            text = text.replace('\u00a0', ' ')
-            text = re.sub(r'\s+', ' ', text)
-            text = re.sub(r'\n\s*\n', '\n\n', text)
-            text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\[\]\{\}\"\'\/\\\n]', ' ', text)
-            if self.nlp_model:
-                doc = self.nlp_model(text)
-                cleaned_tokens = []
-                for token in doc:
-                    if not token.is_stop and not token.is_punct and len(token.text.strip()) > 1:
-                        cleaned_tokens.append(token.lemma_.lower())
-                cleaned_text = " ".join(cleaned_tokens)
+                normalized.append("")
+                continue
+            text = text.strip().translate(_TRANSLATE_TABLE)
+            text = _WS_RE.sub(' ', text)
+            normalized.append(_KEEP_RE.sub(' ', text))
+        try:
+            if not self.nlp_model:
+                return [self._basic_clean_text(text) if text else "" for text in normalized]
+            pending = [i for i, text in enumerate(normalized) if text]
+            lemmatized = await _lemmatize_in_pool([normalized[i] for i in pending])
+            cleaned_texts = [""] * len(normalized)
+            for i, cleaned_text in zip(pending, lemmatized):
+                text = normalized[i]
                 if len(cleaned_text) < len(text) * 0.3:
-                    return self._basic_clean_text(text)
-                return cleaned_text
-            else:
-                return self._basic_clean_text(text)
+                    cleaned_text = self._basic_clean_text(text)
+                cleaned_texts[i] = cleaned_text
+            return cleaned_texts
         except Exception as e:
             logger.error(f"Error in advanced text cleaning: {e}")
-            return self._basic_clean_text(text)
+            return [self._basic_clean_text(text) if text else "" for text in normalized]
 
     async def _sonnet_chunk_text_intelligent(self, text: str, max_chunk_size: int = 1000, 
                                            overlap_size: int = 200, min_chunk_size: int = 100) -> List[Dict[str, Any]]:
@@ -387,33 +828,23 @@ class MustanDocumentManager:
                     "total_chunks": 1,
                     "start_pos": 0,
                     "end_pos": len(text),
-                    "token_count": len(text.split())
+                    "token_count": count_tokens(text)
                 }]
             chunks = []
             start = 0
             chunk_index = 0
-            boundary_patterns = [
-                r'\n\n+',      # Paragraph breaks
-                r'\. [A-Z]',   # Sentence endings followed by capital letter
-                r'[.!?]\s+',   # Any sentence ending
-                r'\n',         # Line breaks
-                r'[,;]\s+',    # Clause breaks
-                r'\s+'         # Word boundaries
-            ]
             while start < len(text):
                 end = min(start + max_chunk_size, len(text))
                 if end < len(text):
                     best_boundary = end
-                    for pattern in boundary_patterns:
-                        search_start = max(start + min_chunk_size, end - 200)
-                        search_text = text[search_start:end]
-                        matches = list(re.finditer(pattern, search_text))
-                        if matches:
-                            last_match = matches[-1]
-                            boundary_pos = search_start + last_match.end()
-                            if boundary_pos > start + min_chunk_size:
-                                best_boundary = boundary_pos
-                                break
+                    search_start = max(start + min_chunk_size, end - 200)
+                    for pattern in _CHUNK_BOUNDARY_PATTERNS:
+                        last_match = None
+                        for last_match in pattern.finditer(text, search_start, end):
+                            pass
+                        if last_match and last_match.end() > start + min_chunk_size:
+                            best_boundary = last_match.end()
+                            break
                     end = best_boundary
                 chunk_text = text[start:end].strip()
                 if chunk_text and len(chunk_text) >= min_chunk_size:
@@ -424,12 +855,12 @@ class MustanDocumentManager:
                         "total_chunks": 0,
                         "start_pos": start,
                         "end_pos": end,
-                        "token_count": len(chunk_text.split())
+                        "token_count": count_tokens(chunk_text)
                     })
                     chunk_index += 1
-                start = max(start + 1, end - overlap_size)
-                if start >= len(text):
+                if end >= len(text):
                     break
+                start = max(start + 1, end - overlap_size)
             total_chunks = len(chunks)
             for chunk in chunks:
                 chunk["total_chunks"] = total_chunks
@@ -438,23 +869,23 @@ class MustanDocumentManager:
             logger.error(f"Error in intelligent chunking: {e}")
             return await self.chunk_text(text, max_chunk_size, overlap_size)
 
-    async def _sonnet_generate_embeddings_batched(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
+    async def _sonnet_generate_embeddings_batched(self, texts: List[str], batch_size: int = 32) -> "np.ndarray":
         """
         Improved embedding generation with batching for better performance.
         """
         try:
             if not texts:
-                return []
+                return self._stack_embeddings([])
             all_embeddings = []
             for i in range(0, len(texts), batch_size):
                 batch = texts[i:i + batch_size]
                 logger.info(f"Processing embedding batch {i//batch_size + 1}/{(len(texts) + batch_size - 1)//batch_size}")
                 loop = asyncio.get_event_loop()
                 batch_embeddings = await loop.run_in_executor(
-                    None, self.embedding_text, batch
+                    _EMBED_EXECUTOR, self.embedding_text, batch
                 )
-                all_embeddings.extend(batch_embeddings)
-            return all_embeddings
+                all_embeddings.append(batch_embeddings)
+            return np.concatenate(all_embeddings)
         except Exception as e:
             logger.error(f"Error in batched embedding generation: {e}")
             return await self.generate_embeddings(texts)
@@ -469,103 +900,165 @@ class DocumentHandler:
     def __init__(self, doc_manager: Optional[MustanDocumentManager] = None):
         self.doc_manager = doc_manager or MustanDocumentManager()
 
-    def generate_chunk_id(self, chat_id: str, chunk_index: int, filename: str = "") -> str:
-        """Generate unique chunk ID."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_id = f"{chat_id}_{timestamp}_{chunk_index}"
-        if filename:
-            file_part = re.sub(r'[^\w\-_\.]', '_', filename)[:20]
-            base_id = f"{file_part}_{base_id}"
-        return base_id
+    def generate_chunk_id(self, chat_id: str, chunk_index: int, filename: str = "",
+                          timestamp: Optional[int] = None) -> str:
+        """
+        Generate unique chunk ID as a BLAKE2b digest of chat, file, index and upload time.
+        Pass one timestamp for a whole batch to avoid reading the clock per chunk.
+        """
+        if timestamp is None:
+            timestamp = int(time.time())
+        key = f"{chat_id}|{filename}|{chunk_index}|{timestamp}"
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=12).hexdigest()
 
     async def check_document_type(self, filename: str) -> str:
         """Check and return document type."""
-        ext = os.path.splitext(filename.lower())[1]
-        type_mapping = {
-            '.pdf': 'pdf',
-            '.docx': 'word',
-            '.txt': 'txt'
-        }
-        return type_mapping.get(ext, 'unsupported')
+        return self.check_document_types([filename])[0]
+
+    def check_document_types(self, filenames: List[str]) -> List[str]:
+        """Return the document type for each filename; extension lookup only, no I/O."""
+        return [DOCUMENT_TYPES.get(os.path.splitext(filename.lower())[1], 'unsupported')
+                for filename in filenames]
 
     async def process_documents_for_chromadb(self, documents: List[Dict[str, Any]], 
                                            chat_id: str, max_chunk_size: int = 1000, 
-                                           overlap_size: int = 200) -> List[Dict[str, Any]]:
+                                           overlap_size: int = 200,
+                                           max_concurrency: int = 16) -> List[Dict[str, Any]]:
         """
         Process documents and prepare them for ChromaDB storage.
+        Extraction and chunking/embedding run concurrently (at most max_concurrency
+        documents at a time); cleaning runs once over all extracted texts.
         Returns list of chunks ready for ChromaDB.
         """
+        documents = [doc for doc in documents if doc.get('content', b'')]
+        if not documents:
+            return []
+        semaphore = asyncio.Semaphore(min(max_concurrency, len(documents)))
+
+        async def bounded(coro):
+            async with semaphore:
+                return await coro
+
+        extracted = await asyncio.gather(*[
+            bounded(self.doc_manager.extract_text_from_file(doc['content'], doc.get('filename', 'unknown')))
+            for doc in documents
+        ], return_exceptions=True)
+        filenames = []
+        original_texts = []
+        for doc, result in zip(documents, extracted):
+            if isinstance(result, Exception):
+                logger.error(f"Error processing document {doc.get('filename', 'unknown')}: {result}")
+                continue
+            filenames.append(doc.get('filename', 'unknown'))
+            original_texts.append(result)
+        if not original_texts:
+            return []
+
+        if hasattr(self.doc_manager, '_sonnet_clean_texts_advanced'):
+            cleaned_texts = await self.doc_manager._sonnet_clean_texts_advanced(original_texts)
+        else:
+            cleaned_texts = await self.doc_manager.clean_texts(original_texts)
+
+        results = await asyncio.gather(*[
+            bounded(self._chunk_and_embed_for_chromadb(
+                filename, original_text, cleaned_text, chat_id, max_chunk_size, overlap_size
+            ))
+            for filename, original_text, cleaned_text in zip(filenames, original_texts, cleaned_texts)
+        ], return_exceptions=True)
         chromadb_chunks = []
-        for doc in documents:
-            try:
-                filename = doc.get('filename', 'unknown')
-                file_content = doc.get('content', b'')
-                if not file_content:
-                    continue
-                original_text = await self.doc_manager.extract_text_from_file(file_content, filename)
-                if hasattr(self.doc_manager, '_sonnet_clean_text_advanced'):
-                    cleaned_text = await self.doc_manager._sonnet_clean_text_advanced(original_text)
-                else:
-                    cleaned_text = await self.doc_manager.clean_text(original_text)
-                if hasattr(self.doc_manager, '_sonnet_chunk_text_intelligent'):
-                    chunks = await self.doc_manager._sonnet_chunk_text_intelligent(
-                        cleaned_text, max_chunk_size, overlap_size
-                    )
-                else:
-                    chunks = await self.doc_manager.chunk_text(cleaned_text, max_chunk_size, overlap_size)
-                chunk_texts = [chunk["text"] for chunk in chunks]
-                if hasattr(self.doc_manager, '_sonnet_generate_embeddings_batched'):
-                    embeddings = await self.doc_manager._sonnet_generate_embeddings_batched(chunk_texts)
-                else:
-                    embeddings = await self.doc_manager.generate_embeddings(chunk_texts)
-                for i, chunk in enumerate(chunks):
-                    chunk_id = self.generate_chunk_id(chat_id, i, filename)
-                    start_pos = chunk.get('start_pos', 0)
-                    end_pos = chunk.get('end_pos', len(original_text))
-                    original_chunk_text = original_text[start_pos:end_pos]
-                    chromadb_chunk = {
-                        "chunk_id": chunk_id,
-                        "chunk_metadata": {
-                            "filename": filename,
-                            "chunk_index": i,
-                            "total_chunks": len(chunks),
-                            "start_pos": start_pos,
-                            "end_pos": end_pos,
-                            "token_count": chunk.get('token_count', len(chunk["text"].split())),
-                            "chat_id": chat_id,
-                            "created_at": datetime.now().isoformat()
-                        },
-                        "embeddings": embeddings[i],
-                        "doctext": original_chunk_text
-                    }
-                    chromadb_chunks.append(chromadb_chunk)
-            except Exception as e:
-                logger.error(f"Error processing document {doc.get('filename', 'unknown')}: {e}")
+        for filename, result in zip(filenames, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error processing document {filename}: {result}")
                 continue
+            chromadb_chunks.extend(result)
+        return chromadb_chunks
+
+    async def _chunk_and_embed_for_chromadb(self, filename: str, original_text: str, cleaned_text: str,
+                                            chat_id: str, max_chunk_size: int,
+                                            overlap_size: int) -> List[Dict[str, Any]]:
+        """
+        Chunk and embed one cleaned document into ChromaDB chunks.
+        """
+        if hasattr(self.doc_manager, '_sonnet_chunk_text_intelligent'):
+            chunks = await self.doc_manager._sonnet_chunk_text_intelligent(
+                cleaned_text, max_chunk_size, overlap_size
+            )
+        else:
+            chunks = await self.doc_manager.chunk_text(cleaned_text, max_chunk_size, overlap_size)
+        chunk_texts = [chunk["text"] for chunk in chunks]
+        if hasattr(self.doc_manager, '_sonnet_generate_embeddings_batched'):
+            embeddings = await self.doc_manager._sonnet_generate_embeddings_batched(chunk_texts)
+        else:
+            embeddings = await self.doc_manager.generate_embeddings(chunk_texts)
+        chromadb_chunks = []
+        timestamp = int(time.time())
+        created_at = datetime.now().isoformat()
+        total_chunks = len(chunks)
+        text_length = len(original_text)
+        for i, chunk in enumerate(chunks):
+            chunk_id = self.generate_chunk_id(chat_id, i, filename, timestamp)
+            start_pos = chunk.get('start_pos', 0)
+            end_pos = chunk.get('end_pos', text_length)
+            chromadb_chunk = {
+                "chunk_id": chunk_id,
+                "chunk_metadata": {
+                    "filename": filename,
+                    "chunk_index": i,
+                    "total_chunks": total_chunks,
+                    "start_pos": start_pos,
+                    "end_pos": end_pos,
+                    "token_count": chunk["token_count"] if "token_count" in chunk else count_tokens(chunk["text"]),
+                    "chat_id": chat_id,
+                    "created_at": created_at
+                },
+                "embeddings": embeddings[i],
+                "doctext": original_text[start_pos:end_pos]
+            }
+            chromadb_chunks.append(chromadb_chunk)
         return chromadb_chunks
 
 # ---------------------------
 # Standalone Async Functions
 # ---------------------------
+# One manager per (model, precision): the embedding model is loaded at most once per process
+_MANAGER_CACHE: Dict[Tuple[str, str], MustanDocumentManager] = {}
+_MANAGER_CACHE_LOCK = threading.Lock()
+
+def get_manager(model_name: str = "BAAI/bge-large-en-v1.5", precision: str = "fp16") -> MustanDocumentManager:
+    """Return the shared MustanDocumentManager for a model and precision, creating it on first use."""
+    key = (model_name, precision)
+    manager = _MANAGER_CACHE.get(key)
+    if manager is None:
+        with _MANAGER_CACHE_LOCK:
+            manager = _MANAGER_CACHE.get(key)
+            if manager is None:
+                manager = MustanDocumentManager(model_name=model_name, precision=precision)
+                _MANAGER_CACHE[key] = manager
+    return manager
+
+def get_default_manager() -> MustanDocumentManager:
+    """Return the shared MustanDocumentManager used by the standalone functions."""
+    return get_manager()
+
 async def extract_text_from_file(file_content: bytes, filename: str) -> str:
     """Standalone function for text extraction."""
-    manager = MustanDocumentManager()
-    return await manager.extract_text_from_file(file_content, filename)
+    return await get_default_manager().extract_text_from_file(file_content, filename)
 
 async def clean_text(text: str) -> str:
     """Standalone function for text cleaning."""
-    manager = MustanDocumentManager()
-    return await manager.clean_text(text)
+    return await get_default_manager().clean_text(text)
+
+async def clean_texts_batch(texts: List[str]) -> List[str]:
+    """Standalone function for cleaning several texts in one spaCy pass."""
+    return await get_default_manager().clean_texts(texts)
 
 async def chunk_text(text: str, max_chunk_size: int = 1000, overlap_size: int = 200) -> List[Dict[str, Any]]:
     """Standalone function for text chunking."""
-    manager = MustanDocumentManager()
-    return await manager.chunk_text(text, max_chunk_size, overlap_size)
+    return await get_default_manager().chunk_text(text, max_chunk_size, overlap_size)
 
-async def generate_embeddings(texts: List[str]) -> List[List[float]]:
+async def generate_embeddings(texts: List[str]) -> "np.ndarray":
     """Standalone function for embedding generation."""
-    manager = MustanDocumentManager()
-    return await manager.generate_embeddings(texts)
+    return await get_default_manager().generate_embeddings(texts)
 
 # ---------------------------
 # Example Usage & Testing
@@ -18,10 +18,15 @@ Usage:
 
 import asyncio
 import json
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
-from utils.doc_utils import DocumentHandler, MustanDocumentManager
-from utils.logger_utils import setup_langgraph_logger
+import numpy as np
+from utils.doc_utils import DocumentHandler, count_tokens, get_manager
+from utils.logger_utils import LangGraphLogger, setup_langgraph_logger
 from config.chromaDB import chroma_manager
 
 # ---------------------------
@@ -45,6 +50,34 @@ except ImportError:
     class TypedDict: pass
     class Annotated: pass
 
+# ---------------------------
+# Retrieval & Storage Settings
+# ---------------------------
+# Paraphrased queries within this cosine similarity reuse the cached retrieval
+QUERY_CACHE_THRESHOLD = 0.97
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_MAX_CHATS = 256
+
+# Chunks per collection.add call; keeps each HNSW insert short so queries are not starved
+CHROMA_ADD_BATCH_SIZE = 256
+
+# n_results is sized to fill this context budget with chunks of the collection's average size
+MAX_CONTEXT_TOKENS = 3000
+DEFAULT_CHUNK_TOKENS = 150
+MAX_N_RESULTS = 20
+
+# Logger of the workflow run in progress; kept out of RAGState so it is never merged or copied
+_current_logger: ContextVar[LangGraphLogger] = ContextVar("langgraph_logger")
+# Workflow instance of the run in progress; the class-level compiled graph dispatches to it
+_current_workflow: ContextVar["RAGWorkflow"] = ContextVar("rag_workflow")
+
+def _dispatch(method_name: str):
+    """Return a graph node that calls method_name on the workflow running in this context."""
+    async def node(state):
+        return await getattr(_current_workflow.get(), method_name)(state)
+    node.__name__ = method_name
+    return node
+
 # ---------------------------
 # Workflow State Definition
 # ---------------------------
@@ -60,16 +93,18 @@ class RAGState(TypedDict):
     extracted_texts: List[Dict[str, Any]]
     cleaned_documents: List[Dict[str, Any]]
     chunked_documents: List[Dict[str, Any]]
+    embedded_chunks: List[Dict[str, Any]]
+    chunk_embeddings: Any
     chromadb_chunks: List[Dict[str, Any]]
-    query_embedding: List[float]
+    query_embedding: Any
     retrieved_docs: List[Dict[str, Any]]
     final_response: str
 
     # Error handling
     errors: List[str]
 
-    # Logger
-    logger: Any
+    # Embedding cache counters when the run started, so stats report this run's share
+    embedding_cache_baseline: Dict[str, int]
 
 # ---------------------------
 # Main Workflow Class
@@ -79,71 +114,229 @@ class RAGWorkflow:
     Orchestrates the RAG workflow using LangGraph.
     Each node represents a step in the pipeline.
     """
-    def __init__(self, embedding_model: str = "BAAI/bge-large-en-v1.5"):
-        self.doc_manager = MustanDocumentManager(model_name=embedding_model)
+    _compile_lock = threading.Lock()
+
+    def __init__(self, embedding_model: str = "BAAI/bge-large-en-v1.5", precision: str = "fp16"):
+        # Chunk and query embeddings share this precision, so stored and query vectors match
+        self.doc_manager = get_manager(embedding_model, precision)
         self.doc_handler = DocumentHandler(self.doc_manager)
-        self.workflow = None
-        self._build_workflow()
-
-    def _build_workflow(self):
-        """Build the LangGraph workflow and define node transitions."""
-        workflow = StateGraph(RAGState)
-        # Add nodes
-        workflow.add_node("initialize", self.initialize_node)
-        workflow.add_node("clean_query", self.clean_query_node)
-        workflow.add_node("check_documents", self.check_documents_node)
-        workflow.add_node("extract_text", self.extract_text_node)
-        workflow.add_node("clean_documents", self.clean_documents_node)
-        workflow.add_node("chunk_documents", self.chunk_documents_node)
-        workflow.add_node("embed_documents", self.embed_documents_node)
-        workflow.add_node("store_in_chromadb", self.store_in_chromadb_node)
-        workflow.add_node("embed_query", self.embed_query_node)
-        workflow.add_node("wait_for_processing", self.wait_for_processing_node)
-        workflow.add_node("retrieve_documents", self.retrieve_documents_node)
-        workflow.add_node("generate_response", self.generate_response_node)
-        # Define the flow
-        workflow.set_entry_point("initialize")
-        workflow.add_edge("initialize", "clean_query")
-        workflow.add_edge("initialize", "check_documents")
-        workflow.add_edge("check_documents", "extract_text")
-        workflow.add_edge("extract_text", "clean_documents")
-        workflow.add_edge("clean_documents", "chunk_documents")
-        workflow.add_edge("chunk_documents", "embed_documents")
-        workflow.add_edge("embed_documents", "store_in_chromadb")
-        workflow.add_edge("clean_query", "embed_query")
-        workflow.add_edge("embed_query", "wait_for_processing")
-        workflow.add_edge("store_in_chromadb", "wait_for_processing")
-        workflow.add_edge("wait_for_processing", "retrieve_documents")
-        workflow.add_edge("retrieve_documents", "generate_response")
-        workflow.add_edge("generate_response", END)
-        self.workflow = workflow.compile()
+        # chat_id -> (collection id, OrderedDict of normalized query embedding bytes -> (embedding, retrieved_docs))
+        self._query_cache: "OrderedDict[str, Tuple[Any, OrderedDict]]" = OrderedDict()
+        # Guards _query_cache and _collection_stats; requests run on concurrent threads,
+        # each with its own event loop
+        self._cache_lock = threading.Lock()
+        # chat_id -> {"collection_id", "count", "tokens", "search_ef"} so retrieval needs no
+        # collection.count() per query
+        self._collection_stats: Dict[str, Dict[str, Any]] = {}
+        self.workflow = self._build_workflow()
+        chroma_manager.add_collection_listener(self._forget_collection)
+
+    @classmethod
+    def _build_workflow(cls):
+        """
+        Build the LangGraph workflow and define node transitions.
+        The topology is static, so it is compiled once per class and shared by
+        all instances; nodes dispatch to the instance set by run_workflow.
+        Only runs with uploaded documents use the graph; see _fast_query.
+        """
+        with cls._compile_lock:
+            compiled = cls.__dict__.get("_compiled_workflow")
+            if compiled is not None:
+                return compiled
+            workflow = StateGraph(RAGState)
+            # Add nodes
+            # The query and document branches run concurrently inside the fanout node
+            workflow.add_node("initialize", _dispatch("initialize_node"))
+            workflow.add_node("fanout", _dispatch("fanout_node"))
+            workflow.add_node("retrieve_documents", _dispatch("retrieve_documents_node"))
+            workflow.add_node("generate_response", _dispatch("generate_response_node"))
+            # Define the flow
+            workflow.set_entry_point("initialize")
+            workflow.add_edge("initialize", "fanout")
+            workflow.add_edge("fanout", "retrieve_documents")
+            workflow.add_edge("retrieve_documents", "generate_response")
+            workflow.add_edge("generate_response", END)
+            compiled = workflow.compile()
+            cls._compiled_workflow = compiled
+            return compiled
+
+    async def _run_branch(self, state: RAGState, nodes) -> Dict[str, Any]:
+        """
+        Run nodes in sequence on a private view of state.
+        Returns the merged updates of the branch, so concurrent branches can be combined.
+        """
+        branch_state = dict(state)
+        updates = {}
+        for node in nodes:
+            node_updates = await node(branch_state)
+            branch_state.update(node_updates)
+            updates.update(node_updates)
+            if branch_state.get("doc_processing_completed") and node == self.check_documents_node:
+                break
+        return updates
+
+    def _forget_collection(self, chat_id: str):
+        """Drop cached state for a chat whose collection was deleted or recreated."""
+        with self._cache_lock:
+            self._query_cache.pop(chat_id, None)
+            self._collection_stats.pop(chat_id, None)
+
+    def _cached_retrieval(self, chat_id: str, collection_id, query_vec: np.ndarray) -> Optional[List[Dict[str, Any]]]:
+        """Return cached retrieved_docs for a near-identical earlier query in this chat, if any."""
+        with self._cache_lock:
+            entry = self._query_cache.get(chat_id)
+            if entry is None:
+                return None
+            cached_collection_id, chat_cache = entry
+            if cached_collection_id != collection_id:
+                # The collection was replaced outside this workflow; its results are stale
+                del self._query_cache[chat_id]
+                return None
+            if not chat_cache:
+                return None
+            keys = list(chat_cache)
+            cache_matrix = np.stack([chat_cache[key][0] for key in keys])
+            sims = cache_matrix @ query_vec
+            best = int(np.argmax(sims))
+            if sims[best] <= QUERY_CACHE_THRESHOLD:
+                return None
+            chat_cache.move_to_end(keys[best])
+            self._query_cache.move_to_end(chat_id)
+            return chat_cache[keys[best]][1]
+
+    def _store_retrieval(self, chat_id: str, collection_id, query_vec: np.ndarray,
+                         retrieved_docs: List[Dict[str, Any]]):
+        """Remember a retrieval result, evicting the least recently used query and chat."""
+        with self._cache_lock:
+            entry = self._query_cache.get(chat_id)
+            if entry is None or entry[0] != collection_id:
+                entry = self._query_cache[chat_id] = (collection_id, OrderedDict())
+            self._query_cache.move_to_end(chat_id)
+            chat_cache = entry[1]
+            chat_cache[query_vec.tobytes()] = (query_vec, retrieved_docs)
+            if len(chat_cache) > QUERY_CACHE_SIZE:
+                chat_cache.popitem(last=False)
+            if len(self._query_cache) > QUERY_CACHE_MAX_CHATS:
+                self._query_cache.popitem(last=False)
+
+    def _retrieval_params(self, chat_id: str, collection) -> int:
+        """
+        Return n_results for a chat's collection and keep its ef_search tuned to its size.
+        The collection size is read once and then tracked as chunks are stored.
+        """
+        with self._cache_lock:
+            stats = self._collection_stats.get(chat_id)
+            if stats is not None and stats["collection_id"] != collection.id:
+                stats = None
+            if stats is not None:
+                count, tokens, search_ef = stats["count"], stats["tokens"], stats.get("search_ef")
+        if stats is None:
+            # Chroma calls stay outside the lock
+            count = collection.count()
+            tokens = count * DEFAULT_CHUNK_TOKENS
+            search_ef = None
+            with self._cache_lock:
+                self._collection_stats[chat_id] = {
+                    "collection_id": collection.id, "count": count, "tokens": tokens
+                }
+        if search_ef is None:
+            search_ef = chroma_manager.tune_search_ef(collection, count)
+            # A failed update (None) is not cached, so the next retrieval tries again
+            if search_ef is not None:
+                with self._cache_lock:
+                    stats = self._collection_stats.get(chat_id)
+                    if stats is not None and stats["collection_id"] == collection.id and stats["count"] == count:
+                        stats["search_ef"] = search_ef
+        avg_chunk_tokens = tokens // count if count else DEFAULT_CHUNK_TOKENS
+        n_results = min(MAX_CONTEXT_TOKENS // max(avg_chunk_tokens, 1), MAX_N_RESULTS)
+        if count:
+            n_results = min(n_results, count)
+        return max(n_results, 1)
+
+    async def _gather_per_document(self, node_name: str, documents: List[Dict[str, Any]],
+                                   process, logger, failure_context: str) -> List[Dict[str, Any]]:
+        """
+        Run process(index, doc) for all documents concurrently.
+        Failed documents are logged and dropped; None results are skipped.
+        """
+        results = await asyncio.gather(
+            *(process(i, doc) for i, doc in enumerate(documents)), return_exceptions=True
+        )
+        processed = []
+        for doc, result in zip(documents, results):
+            if isinstance(result, Exception):
+                logger.log_error(node_name, result, failure_context.format(doc.get('filename', 'unknown')))
+            elif result is not None:
+                processed.append(result)
+        return processed
 
     # ---------------------------
     # Workflow Node Methods
     # ---------------------------
 
-    async def initialize_node(self, state: RAGState) -> RAGState:
-        """Initialize workflow state and logger."""
+    async def initialize_node(self, state: RAGState) -> Dict[str, Any]:
+        """Initialize workflow state."""
         chat_id = state.get("chat_id", f"chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-        logger = setup_langgraph_logger(chat_id)
+        logger = _current_logger.get()
         logger.log_node_start("initialize", {
             "chat_id": chat_id,
             "query_length": len(state.get("queryText", "")),
             "documents_count": len(state.get("documents", []))
         })
-        new_state = {
-            **state,
+        updates = {
             "chat_id": chat_id,
             "doc_processing_completed": False,
-            "errors": [],
-            "logger": logger
+            "errors": []
         }
         logger.log_node_end("initialize", {"status": "initialized"})
-        return new_state
+        return updates
+
+    async def fanout_node(self, state: RAGState) -> Dict[str, Any]:
+        """
+        Clean the query while documents are extracted, cleaned and chunked,
+        then embed the query and all chunks in one batch and store the chunks.
+        """
+        logger = _current_logger.get()
+        logger.log_node_start("fanout", {
+            "documents_count": len(state.get("documents", []))
+        })
+        query_task = asyncio.create_task(self._run_branch(state, [
+            self.clean_query_node
+        ]))
+        doc_task = asyncio.create_task(self._run_branch(state, [
+            self.check_documents_node,
+            self.extract_text_node,
+            self.clean_documents_node,
+            self.chunk_documents_node
+        ]))
+        doc_updates, query_updates = await asyncio.gather(doc_task, query_task)
+        updates = {**doc_updates, **query_updates}
+        updates.update(await self.embed_documents_node({**state, **updates}))
+        if not updates.get("doc_processing_completed"):
+            updates.update(await self.store_in_chromadb_node({**state, **updates}))
+        logger.log_node_end("fanout", {
+            "doc_processing_completed": updates.get("doc_processing_completed", False),
+            "query_embedding_ready": len(updates.get("query_embedding", [])) > 0
+        })
+        return updates
+
+    async def query_only_node(self, state: RAGState) -> Dict[str, Any]:
+        """Clean and embed the query when there are no documents to process."""
+        logger = _current_logger.get()
+        logger.log_node_start("query_only", {"query_length": len(state.get("queryText", ""))})
+        updates = await self._run_branch(state, [
+            self.clean_query_node,
+            self.embed_documents_node
+        ])
+        updates["doc_processing_completed"] = True
+        logger.log_node_end("query_only", {
+            "query_embedding_ready": len(updates.get("query_embedding", [])) > 0
+        })
+        return updates
 
-    async def clean_query_node(self, state: RAGState) -> RAGState:
+    async def clean_query_node(self, state: RAGState) -> Dict[str, Any]:
         """Clean the query text by removing punctuation and stopwords."""
-        logger = state["logger"]
+        logger = _current_logger.get()
         logger.log_node_start("clean_query", {"original_query": state["queryText"]})
         try:
             query_text = state["queryText"]
@@ -155,43 +348,40 @@ class RAGWorkflow:
                 "original": query_text,
                 "cleaned": cleaned_query
             }, "Query cleaned successfully")
-            new_state = {**state, "query_cleaned": cleaned_query}
+            updates = {"query_cleaned": cleaned_query}
             logger.log_node_end("clean_query", {"cleaned_query": cleaned_query})
-            return new_state
+            return updates
         except Exception as e:
             logger.log_error("clean_query", e)
             errors = state.get("errors", [])
             errors.append(f"Query cleaning error: {str(e)}")
-            return {**state, "errors": errors, "query_cleaned": state["queryText"]}
+            return {"errors": errors, "query_cleaned": state["queryText"]}
 
-    async def check_documents_node(self, state: RAGState) -> RAGState:
+    async def check_documents_node(self, state: RAGState) -> Dict[str, Any]:
         """Check if documents are uploaded and determine processing path."""
-        logger = state["logger"]
+        logger = _current_logger.get()
+        documents = state.get("documents", [])
         logger.log_node_start("check_documents", {
-            "documents_count": len(state.get("documents", []))
+            "documents_count": len(documents)
         })
         try:
-            documents = state.get("documents", [])
             if not documents:
                 logger.log_intermediate_result("document_check", {
                     "status": "no_documents",
                     "action": "skip_processing"
                 }, "No documents to process, setting processing as completed")
-                new_state = {**state, "doc_processing_completed": True}
+                updates = {"doc_processing_completed": True}
                 logger.log_node_end("check_documents", {"status": "no_documents_completed"})
-                return new_state
-            doc_types = []
-            supported_docs = []
-            for doc in documents:
-                filename = doc.get("filename", "unknown")
-                doc_type = await self.doc_handler.check_document_type(filename)
-                doc_types.append({"filename": filename, "type": doc_type})
-                if doc_type != "unsupported":
-                    supported_docs.append(doc)
+                return updates
+            filenames = [doc.get("filename", "unknown") for doc in documents]
+            types = self.doc_handler.check_document_types(filenames)
+            doc_types = [{"filename": filename, "type": doc_type}
+                         for filename, doc_type in zip(filenames, types)]
+            supported_docs = [doc for doc, doc_type in zip(documents, types)
+                              if doc_type != "unsupported"]
             logger.log_intermediate_result("document_types", doc_types,
                                          f"Found {len(supported_docs)} supported documents")
-            new_state = {
-                **state,
+            updates = {
                 "documents": supported_docs,
                 "doc_processing_completed": len(supported_docs) == 0
             }
@@ -199,163 +389,170 @@ class RAGWorkflow:
                 "supported_count": len(supported_docs),
                 "processing_needed": len(supported_docs) > 0
             })
-            return new_state
+            return updates
         except Exception as e:
             logger.log_error("check_documents", e)
             errors = state.get("errors", [])
             errors.append(f"Document checking error: {str(e)}")
-            return {**state, "errors": errors, "doc_processing_completed": True}
+            return {"errors": errors, "doc_processing_completed": True}
 
-    async def extract_text_node(self, state: RAGState) -> RAGState:
+    async def extract_text_node(self, state: RAGState) -> Dict[str, Any]:
         """Extract text from documents based on their type."""
-        logger = state["logger"]
+        logger = _current_logger.get()
+        documents = state.get("documents", [])
         logger.log_node_start("extract_text", {
-            "documents_to_process": len(state.get("documents", []))
+            "documents_to_process": len(documents)
         })
         try:
-            documents = state.get("documents", [])
-            extracted_texts = []
-            for i, doc in enumerate(documents):
-                try:
-                    filename = doc.get("filename", f"doc_{i}")
-                    content = doc.get("content", b"")
-                    if not content:
-                        logger.log_intermediate_result("text_extraction", {
-                            "filename": filename,
-                            "status": "no_content"
-                        }, "Skipping document with no content")
-                        continue
-                    extracted_text = await self.doc_manager.extract_text_from_file(content, filename)
-                    extracted_doc = {
-                        "filename": filename,
-                        "original_text": extracted_text,
-                        "text_length": len(extracted_text),
-                        "word_count": len(extracted_text.split())
-                    }
-                    extracted_texts.append(extracted_doc)
+
+            async def extract_one(i, doc):
+                filename = doc.get("filename", f"doc_{i}")
+                content = doc.get("content", b"")
+                if not content:
                     logger.log_intermediate_result("text_extraction", {
                         "filename": filename,
-                        "text_length": len(extracted_text),
-                        "word_count": len(extracted_text.split())
-                    }, f"Successfully extracted text from {filename}")
-                except Exception as e:
-                    logger.log_error("extract_text", e, f"Failed to extract from {doc.get('filename', 'unknown')}")
-                    continue
-            new_state = {**state, "extracted_texts": extracted_texts}
+                        "status": "no_content"
+                    }, "Skipping document with no content")
+                    return None
+                extracted_text = await self.doc_manager.extract_text_from_file(content, filename)
+                text_length = len(extracted_text)
+                word_count = count_tokens(extracted_text)
+                extracted_doc = {
+                    "filename": filename,
+                    "original_text": extracted_text,
+                    "text_length": text_length,
+                    "word_count": word_count
+                }
+                logger.log_intermediate_result("text_extraction", {
+                    "filename": filename,
+                    "text_length": text_length,
+                    "word_count": word_count
+                }, f"Successfully extracted text from {filename}")
+                return extracted_doc
+
+            extracted_texts = await self._gather_per_document(
+                "extract_text", documents, extract_one, logger, "Failed to extract from {}"
+            )
+            updates = {"extracted_texts": extracted_texts}
             logger.log_node_end("extract_text", {
                 "extracted_count": len(extracted_texts),
                 "total_words": sum(doc["word_count"] for doc in extracted_texts)
             })
-            return new_state
+            return updates
         except Exception as e:
             logger.log_error("extract_text", e)
             errors = state.get("errors", [])
             errors.append(f"Text extraction error: {str(e)}")
-            return {**state, "errors": errors, "extracted_texts": []}
+            return {"errors": errors, "extracted_texts": []}
 
-    async def clean_documents_node(self, state: RAGState) -> RAGState:
+    async def clean_documents_node(self, state: RAGState) -> Dict[str, Any]:
         """Clean extracted text from documents."""
-        logger = state["logger"]
+        logger = _current_logger.get()
         extracted_texts = state.get("extracted_texts", [])
         logger.log_node_start("clean_documents", {
             "documents_to_clean": len(extracted_texts)
         })
         try:
-            cleaned_documents = []
-            for doc in extracted_texts:
-                try:
-                    original_text = doc["original_text"]
-                    if hasattr(self.doc_manager, '_sonnet_clean_text_advanced'):
-                        cleaned_text = await self.doc_manager._sonnet_clean_text_advanced(original_text)
-                    else:
-                        cleaned_text = await self.doc_manager.clean_text(original_text)
-                    cleaned_doc = {
-                        **doc,
-                        "cleaned_text": cleaned_text,
-                        "cleaned_length": len(cleaned_text),
-                        "cleaned_word_count": len(cleaned_text.split())
-                    }
-                    cleaned_documents.append(cleaned_doc)
-                    logger.log_intermediate_result("text_cleaning", {
-                        "filename": doc["filename"],
-                        "original_length": len(original_text),
-                        "cleaned_length": len(cleaned_text),
-                        "reduction_ratio": 1 - (len(cleaned_text) / len(original_text)) if len(original_text) > 0 else 0
-                    }, f"Cleaned text for {doc['filename']}")
-                except Exception as e:
-                    logger.log_error("clean_documents", e, f"Failed to clean {doc.get('filename', 'unknown')}")
-                    continue
-            new_state = {**state, "cleaned_documents": cleaned_documents}
+            async def clean_one(i, doc):
+                original_text = doc["original_text"]
+                if hasattr(self.doc_manager, '_sonnet_clean_text_advanced'):
+                    cleaned_text = await self.doc_manager._sonnet_clean_text_advanced(original_text)
+                else:
+                    cleaned_text = await self.doc_manager.clean_text(original_text)
+                original_length = doc["text_length"]
+                cleaned_length = len(cleaned_text)
+                cleaned_doc = {
+                    **doc,
+                    "cleaned_text": cleaned_text,
+                    "cleaned_length": cleaned_length,
+                    "cleaned_word_count": count_tokens(cleaned_text)
+                }
+                logger.log_intermediate_result("text_cleaning", {
+                    "filename": doc["filename"],
+                    "original_length": original_length,
+                    "cleaned_length": cleaned_length,
+                    "reduction_ratio": 1 - (cleaned_length / original_length) if original_length > 0 else 0
+                }, f"Cleaned text for {doc['filename']}")
+                return cleaned_doc
+
+            cleaned_documents = await self._gather_per_document(
+                "clean_documents", extracted_texts, clean_one, logger, "Failed to clean {}"
+            )
+            updates = {"cleaned_documents": cleaned_documents}
             logger.log_node_end("clean_documents", {
                 "cleaned_count": len(cleaned_documents),
                 "total_cleaned_words": sum(doc["cleaned_word_count"] for doc in cleaned_documents)
             })
-            return new_state
+            return updates
         except Exception as e:
             logger.log_error("clean_documents", e)
             errors = state.get("errors", [])
             errors.append(f"Document cleaning error: {str(e)}")
-            return {**state, "errors": errors, "cleaned_documents": []}
+            return {"errors": errors, "cleaned_documents": []}
 
-    async def chunk_documents_node(self, state: RAGState) -> RAGState:
+    async def chunk_documents_node(self, state: RAGState) -> Dict[str, Any]:
         """Chunk cleaned documents with overlap."""
-        logger = state["logger"]
+        logger = _current_logger.get()
         cleaned_documents = state.get("cleaned_documents", [])
         logger.log_node_start("chunk_documents", {
             "documents_to_chunk": len(cleaned_documents)
         })
         try:
-            chunked_documents = []
-            total_chunks = 0
-            for doc in cleaned_documents:
-                try:
-                    cleaned_text = doc["cleaned_text"]
-                    if hasattr(self.doc_manager, '_sonnet_chunk_text_intelligent'):
-                        chunks = await self.doc_manager._sonnet_chunk_text_intelligent(
-                            cleaned_text, max_chunk_size=1000, overlap_size=200
-                        )
-                    else:
-                        chunks = await self.doc_manager.chunk_text(
-                            cleaned_text, max_chunk_size=1000, overlap_size=200
-                        )
-                    chunked_doc = {
-                        **doc,
-                        "chunks": chunks,
-                        "chunk_count": len(chunks)
-                    }
-                    chunked_documents.append(chunked_doc)
-                    total_chunks += len(chunks)
-                    logger.log_intermediate_result("text_chunking", {
-                        "filename": doc["filename"],
-                        "text_length": len(cleaned_text),
-                        "chunk_count": len(chunks),
-                        "avg_chunk_size": sum(len(chunk["text"]) for chunk in chunks) // len(chunks) if chunks else 0
-                    }, f"Chunked {doc['filename']} into {len(chunks)} chunks")
-                except Exception as e:
-                    logger.log_error("chunk_documents", e, f"Failed to chunk {doc.get('filename', 'unknown')}")
-                    continue
-            new_state = {**state, "chunked_documents": chunked_documents}
+            async def chunk_one(i, doc):
+                cleaned_text = doc["cleaned_text"]
+                if hasattr(self.doc_manager, '_sonnet_chunk_text_intelligent'):
+                    chunks = await self.doc_manager._sonnet_chunk_text_intelligent(
+                        cleaned_text, max_chunk_size=1000, overlap_size=200
+                    )
+                else:
+                    chunks = await self.doc_manager.chunk_text(
+                        cleaned_text, max_chunk_size=1000, overlap_size=200
+                    )
+                # Storage relies on every chunk carrying its token count
+                for chunk in chunks:
+                    if "token_count" not in chunk:
+                        chunk["token_count"] = count_tokens(chunk["text"])
+                logger.log_intermediate_result("text_chunking", {
+                    "filename": doc["filename"],
+                    "text_length": len(cleaned_text),
+                    "chunk_count": len(chunks),
+                    "avg_chunk_size": sum(len(chunk["text"]) for chunk in chunks) // len(chunks) if chunks else 0
+                }, f"Chunked {doc['filename']} into {len(chunks)} chunks")
+                return {
+                    **doc,
+                    "chunks": chunks,
+                    "chunk_count": len(chunks)
+                }
+
+            chunked_documents = await self._gather_per_document(
+                "chunk_documents", cleaned_documents, chunk_one, logger, "Failed to chunk {}"
+            )
+            total_chunks = sum(doc["chunk_count"] for doc in chunked_documents)
+            updates = {"chunked_documents": chunked_documents}
             logger.log_node_end("chunk_documents", {
                 "documents_chunked": len(chunked_documents),
                 "total_chunks": total_chunks
             })
-            return new_state
+            return updates
         except Exception as e:
             logger.log_error("chunk_documents", e)
             errors = state.get("errors", [])
             errors.append(f"Document chunking error: {str(e)}")
-            return {**state, "errors": errors, "chunked_documents": []}
+            return {"errors": errors, "chunked_documents": []}
 
-    async def embed_documents_node(self, state: RAGState) -> RAGState:
-        """Generate embeddings for document chunks."""
-        logger = state["logger"]
+    async def embed_documents_node(self, state: RAGState) -> Dict[str, Any]:
+        """Generate embeddings for the cleaned query and all document chunks in one batch."""
+        logger = _current_logger.get()
         chunked_documents = state.get("chunked_documents", [])
+        query_cleaned = state.get("query_cleaned", state.get("queryText", ""))
         logger.log_node_start("embed_documents", {
+            "query": query_cleaned,
             "documents_with_chunks": len(chunked_documents)
         })
         try:
             all_chunks = []
-            chunk_texts = []
+            # The query goes first so its embedding is row 0 of the batch
+            chunk_texts = [query_cleaned]
             for doc in chunked_documents:
                 for chunk in doc["chunks"]:
                     all_chunks.append({
@@ -364,87 +561,117 @@ class RAGWorkflow:
                         "original_text": doc["original_text"]
                     })
                     chunk_texts.append(chunk["text"])
+            # Identical texts (boilerplate, re-uploads) are embedded once and fanned back out
+            unique_texts: Dict[str, int] = {}
+            order = [unique_texts.setdefault(text, len(unique_texts)) for text in chunk_texts]
             logger.log_intermediate_result("embedding_preparation", {
                 "total_chunks": len(all_chunks),
-                "total_text_length": sum(len(text) for text in chunk_texts)
-            }, "Prepared chunks for embedding")
+                "unique_texts": len(unique_texts),
+                "total_text_length": sum(len(text) for text in chunk_texts[1:])
+            }, "Prepared query and chunks for embedding")
             if hasattr(self.doc_manager, '_sonnet_generate_embeddings_batched'):
-                embeddings = await self.doc_manager._sonnet_generate_embeddings_batched(chunk_texts)
+                unique_embeddings = await self.doc_manager._sonnet_generate_embeddings_batched(list(unique_texts))
             else:
-                embeddings = await self.doc_manager.generate_embeddings(chunk_texts)
-            embedded_chunks = []
-            for i, chunk_info in enumerate(all_chunks):
-                embedded_chunk = {
-                    **chunk_info,
-                    "embedding": embeddings[i]
-                }
-                embedded_chunks.append(embedded_chunk)
-            new_state = {**state, "embedded_chunks": embedded_chunks}
+                unique_embeddings = await self.doc_manager.generate_embeddings(list(unique_texts))
+            embeddings = unique_embeddings[order]
+            # Row i of chunk_embeddings belongs to embedded_chunks[i]
+            query_embedding = embeddings[0]
+            chunk_embeddings = embeddings[1:]
+            updates = {
+                "query_embedding": query_embedding,
+                "embedded_chunks": all_chunks,
+                "chunk_embeddings": chunk_embeddings
+            }
             logger.log_node_end("embed_documents", {
-                "embedded_chunks": len(embedded_chunks),
-                "embedding_dimension": len(embeddings[0]) if embeddings else 0
+                "embedded_chunks": len(all_chunks),
+                "embedding_dimension": len(query_embedding)
             })
-            return new_state
+            return updates
         except Exception as e:
             logger.log_error("embed_documents", e)
             errors = state.get("errors", [])
-            errors.append(f"Document embedding error: {str(e)}")
-            return {**state, "errors": errors, "embedded_chunks": []}
+            errors.append(f"Embedding error: {str(e)}")
+            return {"errors": errors, "query_embedding": [], "embedded_chunks": [], "chunk_embeddings": []}
 
-    async def store_in_chromadb_node(self, state: RAGState) -> RAGState:
+    async def store_in_chromadb_node(self, state: RAGState) -> Dict[str, Any]:
         """Store processed chunks in ChromaDB."""
-        logger = state["logger"]
+        logger = _current_logger.get()
         embedded_chunks = state.get("embedded_chunks", [])
+        chunk_embeddings = state.get("chunk_embeddings", [])
         chat_id = state["chat_id"]
         logger.log_node_start("store_in_chromadb", {
             "chunks_to_store": len(embedded_chunks),
             "chat_id": chat_id
         })
         try:
-            collection_result = chroma_manager.create_collection(chat_id)
+            collection_result = chroma_manager.create_collection(chat_id, expected_size=len(embedded_chunks))
             logger.log_intermediate_result("collection_creation", collection_result,
                                          "Ensured ChromaDB collection exists")
             collection = chroma_manager.get_collection(chat_id)
             if not collection:
                 raise Exception(f"Failed to get collection for chat_id: {chat_id}")
-            chunk_ids = []
-            embeddings_list = []
-            metadatas = []
-            documents = []
-            for i, chunk_info in enumerate(embedded_chunks):
-                chunk_data = chunk_info["chunk_data"]
-                chunk_id = self.doc_handler.generate_chunk_id(
-                    chat_id, i, chunk_info["doc_filename"]
-                )
-                metadata = {
+            timestamp = int(time.time())
+            now_iso = datetime.now().isoformat()
+            total_chunks = len(embedded_chunks)
+            chunk_datas = [chunk_info["chunk_data"] for chunk_info in embedded_chunks]
+            generate_chunk_id = self.doc_handler.generate_chunk_id
+            chunk_ids = [
+                generate_chunk_id(chat_id, i, chunk_info["doc_filename"], timestamp)
+                for i, chunk_info in enumerate(embedded_chunks)
+            ]
+            metadatas = [
+                {
                     "filename": chunk_info["doc_filename"],
                     "chunk_index": chunk_data.get("chunk_index", i),
-                    "total_chunks": chunk_data.get("total_chunks", len(embedded_chunks)),
+                    "total_chunks": chunk_data.get("total_chunks", total_chunks),
                     "start_pos": chunk_data.get("start_pos", 0),
                     "end_pos": chunk_data.get("end_pos", 0),
-                    "token_count": chunk_data.get("token_count", len(chunk_data["text"].split())),
+                    "token_count": chunk_data["token_count"],
                     "chat_id": chat_id,
-                    "created_at": datetime.now().isoformat()
+                    "created_at": now_iso
                 }
-                start_pos = chunk_data.get("start_pos", 0)
-                end_pos = chunk_data.get("end_pos", len(chunk_info["original_text"]))
-                original_chunk_text = chunk_info["original_text"][start_pos:end_pos]
-                chunk_ids.append(chunk_id)
-                embeddings_list.append(chunk_info["embedding"])
-                metadatas.append(metadata)
-                documents.append(original_chunk_text)
-            collection.add(
-                ids=chunk_ids,
-                embeddings=embeddings_list,
-                metadatas=metadatas,
-                documents=documents
-            )
+                for i, (chunk_info, chunk_data) in enumerate(zip(embedded_chunks, chunk_datas))
+            ]
+            documents = [
+                chunk_info["original_text"][
+                    chunk_data.get("start_pos", 0):chunk_data.get("end_pos", len(chunk_info["original_text"]))
+                ]
+                for chunk_info, chunk_data in zip(embedded_chunks, chunk_datas)
+            ]
+            # Chroma's client is synchronous, so each batch is inserted off the event loop
+            loop = asyncio.get_running_loop()
+            for i in range(0, len(chunk_ids), CHROMA_ADD_BATCH_SIZE):
+                batch = slice(i, i + CHROMA_ADD_BATCH_SIZE)
+                await loop.run_in_executor(None, lambda: collection.add(
+                    ids=chunk_ids[batch],
+                    embeddings=chunk_embeddings[batch],
+                    metadatas=metadatas[batch],
+                    documents=documents[batch]
+                ))
+                await asyncio.sleep(0)
+            stored_tokens = sum(metadata["token_count"] for metadata in metadatas)
+            with self._cache_lock:
+                # New chunks can change the answer to any cached query in this chat
+                self._query_cache.pop(chat_id, None)
+                stats = self._collection_stats.get(chat_id)
+                if collection_result.get("status") == "success":
+                    stats = self._collection_stats[chat_id] = {
+                        "collection_id": collection.id, "count": 0, "tokens": 0
+                    }
+                elif stats is not None and stats["collection_id"] != collection.id:
+                    # Tracked for a collection that has since been replaced; recount on retrieval
+                    del self._collection_stats[chat_id]
+                    stats = None
+                if stats is not None:
+                    stats["count"] += len(chunk_ids)
+                    stats["tokens"] += stored_tokens
+                    # Re-check ef_search against the new size on the next retrieval
+                    stats.pop("search_ef", None)
             logger.log_intermediate_result("chromadb_storage", {
                 "stored_chunks": len(chunk_ids),
                 "collection_name": chat_id
             }, "Successfully stored chunks in ChromaDB")
-            new_state = {
-                **state,
+            updates = {
                 "doc_processing_completed": True,
                 "chromadb_chunks": embedded_chunks
             }
@@ -452,54 +679,16 @@ class RAGWorkflow:
                 "status": "completed",
                 "stored_chunks": len(chunk_ids)
             })
-            return new_state
+            return updates
         except Exception as e:
             logger.log_error("store_in_chromadb", e)
             errors = state.get("errors", [])
             errors.append(f"ChromaDB storage error: {str(e)}")
-            return {**state, "errors": errors, "doc_processing_completed": True}
+            return {"errors": errors, "doc_processing_completed": True}
 
-    async def embed_query_node(self, state: RAGState) -> RAGState:
-        """Generate embedding for the cleaned query."""
-        logger = state["logger"]
-        query_cleaned = state.get("query_cleaned", state.get("queryText", ""))
-        logger.log_node_start("embed_query", {"query": query_cleaned})
-        try:
-            query_embeddings = await self.doc_manager.generate_embeddings([query_cleaned])
-            query_embedding = query_embeddings[0]
-            logger.log_intermediate_result("query_embedding", {
-                "query": query_cleaned,
-                "embedding_dimension": len(query_embedding)
-            }, "Generated query embedding")
-            new_state = {**state, "query_embedding": query_embedding}
-            logger.log_node_end("embed_query", {
-                "embedding_dimension": len(query_embedding)
-            })
-            return new_state
-        except Exception as e:
-            logger.log_error("embed_query", e)
-            errors = state.get("errors", [])
-            errors.append(f"Query embedding error: {str(e)}")
-            return {**state, "errors": errors, "query_embedding": []}
-
-    async def wait_for_processing_node(self, state: RAGState) -> RAGState:
-        """Wait for document processing to complete."""
-        logger = state["logger"]
-        logger.log_node_start("wait_for_processing", {
-            "doc_processing_completed": state.get("doc_processing_completed", False)
-        })
-        processing_completed = state.get("doc_processing_completed", False)
-        logger.log_intermediate_result("processing_check", {
-            "completed": processing_completed
-        }, "Checked document processing status")
-        logger.log_node_end("wait_for_processing", {
-            "status": "ready" if processing_completed else "waiting"
-        })
-        return state
-
-    async def retrieve_documents_node(self, state: RAGState) -> RAGState:
+    async def retrieve_documents_node(self, state: RAGState) -> Dict[str, Any]:
         """Retrieve relevant documents from ChromaDB using query embedding."""
-        logger = state["logger"]
+        logger = _current_logger.get()
         query_embedding = state.get("query_embedding", [])
         chat_id = state["chat_id"]
         logger.log_node_start("retrieve_documents", {
@@ -507,17 +696,32 @@ class RAGWorkflow:
             "query_embedding_ready": len(query_embedding) > 0
         })
         try:
-            if not query_embedding:
+            if len(query_embedding) == 0:
                 raise Exception("No query embedding available")
+            query_vec = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query_vec)
+            if norm > 0:
+                query_vec = query_vec / norm
             collection = chroma_manager.get_collection(chat_id)
             if not collection:
                 logger.log_intermediate_result("retrieval", {
                     "status": "no_collection"
                 }, "No collection found, returning empty results")
-                return {**state, "retrieved_docs": []}
+                return {"retrieved_docs": []}
+            cached_docs = self._cached_retrieval(chat_id, collection.id, query_vec)
+            if cached_docs is not None:
+                logger.log_intermediate_result("document_retrieval", {
+                    "retrieved_count": len(cached_docs),
+                    "cache": "hit"
+                }, "Reused cached retrieval for a near-identical query")
+                logger.log_node_end("retrieve_documents", {
+                    "retrieved_count": len(cached_docs)
+                })
+                return {"retrieved_docs": cached_docs}
+            n_results = self._retrieval_params(chat_id, collection)
             results = collection.query(
                 query_embeddings=[query_embedding],
-                n_results=5,
+                n_results=n_results,
                 include=["documents", "metadatas", "distances"]
             )
             retrieved_docs = []
@@ -530,23 +734,25 @@ class RAGWorkflow:
                     }
                     retrieved_docs.append(retrieved_doc)
             logger.log_intermediate_result("document_retrieval", {
+                "n_results": n_results,
                 "retrieved_count": len(retrieved_docs),
                 "distances": [doc["distance"] for doc in retrieved_docs]
             }, "Retrieved relevant documents from ChromaDB")
-            new_state = {**state, "retrieved_docs": retrieved_docs}
+            self._store_retrieval(chat_id, collection.id, query_vec, retrieved_docs)
+            updates = {"retrieved_docs": retrieved_docs}
             logger.log_node_end("retrieve_documents", {
                 "retrieved_count": len(retrieved_docs)
             })
-            return new_state
+            return updates
         except Exception as e:
             logger.log_error("retrieve_documents", e)
             errors = state.get("errors", [])
             errors.append(f"Document retrieval error: {str(e)}")
-            return {**state, "errors": errors, "retrieved_docs": []}
+            return {"errors": errors, "retrieved_docs": []}
 
-    async def generate_response_node(self, state: RAGState) -> RAGState:
+    async def generate_response_node(self, state: RAGState) -> Dict[str, Any]:
         """Generate final response using LLM with query and retrieved documents."""
-        logger = state["logger"]
+        logger = _current_logger.get()
         query_text = state.get("queryText", "")
         retrieved_docs = state.get("retrieved_docs", [])
         logger.log_node_start("generate_response", {
@@ -554,10 +760,9 @@ class RAGWorkflow:
             "retrieved_docs_count": len(retrieved_docs)
         })
         try:
-            context_parts = []
-            for i, doc in enumerate(retrieved_docs):
-                context_parts.append(f"Document {i+1}:\n{doc['document_text']}\n")
-            context = "\n".join(context_parts)
+            context = "\n\n".join(
+                f"Document {i+1}:\n{doc['document_text']}" for i, doc in enumerate(retrieved_docs)
+            )
             if retrieved_docs:
                 response = f"""Based on the provided documents, here's the response to your query: "{query_text}"
 
@@ -579,30 +784,48 @@ Please try providing more relevant documents or rephrasing your query."""
                 "context_length": len(context),
                 "response_length": len(response)
             }, "Generated final response")
+            # The manager's counters are process-wide; report the change since this run started
+            # (runs overlapping on the same model are included)
+            cache_stats = self.doc_manager.embedding_cache_stats()
+            baseline = state.get("embedding_cache_baseline") or {"hits": 0, "misses": 0}
             logger.log_processing_stats({
                 "Total Documents Processed": len(state.get("documents", [])),
                 "Total Chunks Created": len(state.get("chromadb_chunks", [])),
                 "Retrieved Documents": len(retrieved_docs),
                 "Errors Encountered": len(state.get("errors", [])),
-                "Processing Completed": state.get("doc_processing_completed", False)
+                "Processing Completed": state.get("doc_processing_completed", False),
+                "Embedding Cache Hits": cache_stats["hits"] - baseline["hits"],
+                "Embedding Cache Misses": cache_stats["misses"] - baseline["misses"]
             })
-            new_state = {**state, "final_response": response}
+            updates = {"final_response": response}
             logger.log_node_end("generate_response", {
                 "response_length": len(response),
                 "status": "completed"
             })
-            logger.close()
-            return new_state
+            return updates
         except Exception as e:
             logger.log_error("generate_response", e)
             errors = state.get("errors", [])
             errors.append(f"Response generation error: {str(e)}")
             error_response = f"I apologize, but I encountered an error while processing your request: {str(e)}"
-            return {**state, "errors": errors, "final_response": error_response}
+            return {"errors": errors, "final_response": error_response}
 
     # ---------------------------
     # Workflow Runner
     # ---------------------------
+    async def _fast_query(self, state: RAGState) -> Dict[str, Any]:
+        """
+        Answer a follow-up query without uploaded documents by calling the
+        query nodes directly, bypassing the LangGraph scheduler.
+        """
+        updates = await self._run_branch(state, [
+            self.initialize_node,
+            self.query_only_node,
+            self.retrieve_documents_node,
+            self.generate_response_node
+        ])
+        return {**state, **updates}
+
     async def run_workflow(self, query_text: str, documents: List[Dict[str, Any]],
                           chat_id: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -621,9 +844,20 @@ Please try providing more relevant documents or rephrasing your query."""
         initial_state = {
             "queryText": query_text,
             "documents": documents,
-            "chat_id": chat_id
+            "chat_id": chat_id,
+            "embedding_cache_baseline": self.doc_manager.embedding_cache_stats()
         }
-        final_state = await self.workflow.ainvoke(initial_state)
+        logger = setup_langgraph_logger(chat_id)
+        token = _current_logger.set(logger)
+        workflow_token = _current_workflow.set(self)
+        try:
+            if documents:
+                final_state = await self.workflow.ainvoke(initial_state)
+            else:
+                final_state = await self._fast_query(initial_state)
+        finally:
+            _current_workflow.reset(workflow_token)
+            _current_logger.reset(token)
         return {
             "chat_id": chat_id,
             "query": query_text,
@@ -637,14 +871,16 @@ Please try providing more relevant documents or rephrasing your query."""
 # ---------------------------
 # Workflow Factory
 # ---------------------------
-def create_rag_workflow(embedding_model: str = "BAAI/bge-large-en-v1.5") -> RAGWorkflow:
+def create_rag_workflow(embedding_model: str = "BAAI/bge-large-en-v1.5",
+                        precision: str = "fp16") -> RAGWorkflow:
     """
     Create and return a RAG workflow instance.
 
     Args:
         embedding_model (str): Embedding model name.
+        precision (str): Embedding precision, "fp16" (default) or "fp32".
 
     Returns:
         RAGWorkflow: Initialized workflow object.
     """
-    return RAGWorkflow(embedding_model=embedding_model)
\ No newline at end of file
+    return RAGWorkflow(embedding_model=embedding_model, precision=precision)
\ No newline at end of file
@@ -1,83 +1,440 @@
 import os
+import atexit
 import logging
+import logging.handlers
 import json
-from datetime import datetime
-from typing import Any, Dict
+import queue
+import re
+import threading
+import time
+import zlib
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Ensure logs directory exists
 LOGS_DIR = Path("./logs")
 LOGS_DIR.mkdir(exist_ok=True)
 
-class LangGraphLogger:
-    def __init__(self, chat_id: str):
-        self.chat_id = chat_id
-        self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.log_file = LOGS_DIR / f"langgraph_{chat_id}_{self.session_id}.txt"
+# Raise to INFO to skip serializing the DEBUG payload records
+LOG_LEVEL = os.getenv("RAG_LOG_LEVEL", "DEBUG").upper()
+if LOG_LEVEL not in logging.getLevelNamesMapping():
+    # setLevel would raise on every partition creation, failing each workflow run
+    logging.getLogger(__name__).warning(f"Unknown RAG_LOG_LEVEL '{LOG_LEVEL}', using INFO")
+    LOG_LEVEL = "INFO"
+# Indented payloads are easier to read but roughly double their size and encode time
+LOG_PRETTY = os.getenv("RAG_LOG_PRETTY", "0") == "1"
+_JSON_INDENT = 2 if LOG_PRETTY else None
+# Marks a record whose message needs no JSON payload appended
+_NO_DATA = object()
+# Record layout; _FastFormatter builds the same line directly
+_LOG_FORMAT = '%(asctime)s - %(chat_id)s - %(levelname)s - %(message)s'
+# Start of a record line as written by _LOG_FORMAT
+_RECORD_START = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - ")
+# Buffered file records are written at this size or after this many seconds
+LOG_FLUSH_BYTES = 64 * 1024
+LOG_FLUSH_INTERVAL = 0.1
+
+# Chats share this many loggers, each with one log file and listener thread
+LOG_PARTITIONS = 16
+_PARTITIONS: List[Optional["_LogPartition"]] = [None] * LOG_PARTITIONS
+_PARTITIONS_LOCK = threading.Lock()
+_SESSION_ID = time.strftime("%Y%m%d_%H%M%S")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    if LOG_PRETTY:
+        _ORJSON_OPTIONS |= orjson.OPT_INDENT_2
+
+class _FastEncoder(json.JSONEncoder):
+    """JSONEncoder whose default() picks a converter by exact type, falling back to str"""
+    _DISPATCH = {
+        datetime: datetime.isoformat,
+        date: date.isoformat,
+        set: list,
+        frozenset: list,
+        type(Path()): str,
+    }
+    
+    def default(self, o: Any) -> Any:
+        convert = self._DISPATCH.get(type(o))
+        if convert is not None:
+            return convert(o)
+        # numpy arrays and scalars, without importing numpy here
+        tolist = getattr(o, "tolist", None)
+        if tolist is not None:
+            return tolist()
+        return str(o)
+
+# Reused for every stdlib-serialized payload
+_ENCODER = _FastEncoder(
+    ensure_ascii=False,
+    indent=_JSON_INDENT,
+    separators=(",", ": ") if LOG_PRETTY else (",", ":"),
+)
+
+def _dumps_bytes(obj: Any) -> bytes:
+    """Serialize a log payload to UTF-8 JSON; orjson when installed, stdlib json otherwise"""
+    if isinstance(obj, bytes):
+        # Already-encoded payloads pass through untouched
+        return obj
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS, default=str)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which the stdlib encoder accepts
+            pass
+    return _ENCODER.encode(obj).encode("utf-8")
+
+class _FastFormatter(logging.Formatter):
+    """
+    Formats _LOG_FORMAT with one f-string, reusing the date-time text
+    for every record created within the same second
+    """
+    _cached_time = (None, "")
+    
+    def __init__(self):
+        super().__init__(_LOG_FORMAT)
+    
+    def _format_time(self, record: logging.LogRecord) -> str:
+        second = int(record.created)
+        cached_second, text = self._cached_time
+        if second != cached_second:
+            text = time.strftime("%Y-%m-%d %H:%M:%S", self.converter(second))
+            # One tuple so a concurrent reader never pairs a second with another's text
+            self._cached_time = (second, text)
+        return f"{text},{int(record.msecs):03d}"
+    
+    def format(self, record: logging.LogRecord) -> str:
+        if record.exc_info or record.exc_text or record.stack_info:
+            return super().format(record)
+        return f"{self._format_time(record)} - {record.chat_id} - {record.levelname} - {record.getMessage()}"
+
+class _PayloadFormatter(_FastFormatter):
+    """Appends a record's JSON payload for handlers that write text"""
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        payload = getattr(record, "payload", _NO_DATA)
+        if payload is _NO_DATA:
+            return text
+        return text + _dumps_bytes(payload).decode("utf-8", errors="replace")
+
+# Shared by every file handler
+_FORMATTER = _FastFormatter()
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records without formatting them; the timestamp and line layout
+    and all I/O happen on the listener thread. The message and JSON payload are
+    rendered here, on the caller's thread, so objects the caller mutates after
+    logging are recorded as they were when logged.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        payload = getattr(record, "payload", _NO_DATA)
+        if payload is not _NO_DATA:
+            record.payload = _dumps_bytes(payload)
+        return record
+
+class _ThreadBuffer:
+    """One thread's pending bytes for a ThreadLocalBufferedFileHandler"""
+    __slots__ = ("buf", "size", "last_write", "lock")
+    
+    def __init__(self):
+        # Allocated once at full size; writes only move size, since shrinking
+        # a bytearray (clear/del) gives its memory back
+        self.buf = bytearray(LOG_FLUSH_BYTES)
+        self.size = 0
+        self.last_write = time.monotonic()
+        # Taken by the owning thread on every emit (uncontended) and by flush()
+        self.lock = threading.Lock()
+
+class ThreadLocalBufferedFileHandler(logging.FileHandler):
+    """
+    FileHandler that encodes each record into a reusable per-thread bytearray
+    and writes it with a single os.write, so no shared lock is held while
+    formatting or encoding. A record's JSON payload is appended as the
+    serializer's bytes, never decoded to str and re-encoded.
+    
+    Records accumulate in the buffer and are written once it reaches
+    LOG_FLUSH_BYTES or LOG_FLUSH_INTERVAL has passed since the last write.
+    Every thread's buffer is registered with the handler, so flush() and
+    close() write out whatever any thread has pending.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._local = threading.local()
+        # Kept after a thread exits so its pending bytes are still flushed
+        self._buffers = []
+        self._buffers_lock = threading.Lock()
+        self._encoding = self.encoding or "utf-8"
+        self._terminator = self.terminator.encode(self._encoding)
+    
+    def handle(self, record: logging.LogRecord):
+        # Same as Handler.handle minus the handler lock; emit is safe without it
+        rv = self.filter(record)
+        if isinstance(rv, logging.LogRecord):
+            # Python 3.12+ filters may return a replacement record
+            record = rv
+        if rv:
+            self.emit(record)
+        return rv
+    
+    def _thread_buffer(self) -> _ThreadBuffer:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = _ThreadBuffer()
+            with self._buffers_lock:
+                self._buffers.append(buffer)
+        return buffer
+    
+    def emit(self, record: logging.LogRecord):
+        try:
+            text = self.format(record).encode(self._encoding)
+            payload = getattr(record, "payload", _NO_DATA)
+            payload = None if payload is _NO_DATA else _dumps_bytes(payload)
+            buffer = self._thread_buffer()
+            with buffer.lock:
+                self._append(buffer, text)
+                if payload is not None:
+                    self._append(buffer, payload)
+                self._append(buffer, self._terminator)
+                if time.monotonic() - buffer.last_write >= LOG_FLUSH_INTERVAL:
+                    self._write_buffer(buffer)
+        except Exception:
+            self.handleError(record)
+    
+    def _append(self, buffer: _ThreadBuffer, data: bytes):
+        buf = buffer.buf
+        size = buffer.size
+        end = size + len(data)
+        if end > len(buf):
+            self._write_buffer(buffer)
+            if len(data) > len(buf):
+                self._write(data)
+                return
+            size, end = 0, len(data)
+        buf[size:end] = data
+        buffer.size = end
+    
+    def _write_buffer(self, buffer: _ThreadBuffer):
+        if buffer.size:
+            self._write(memoryview(buffer.buf)[:buffer.size])
+            buffer.size = 0
+        buffer.last_write = time.monotonic()
+    
+    def _write(self, data):
+        if self.stream is None:
+            with self.lock:
+                if self.stream is None:
+                    self.stream = self._open()
+        fd = self.stream.fileno()
+        view = memoryview(data)
+        written = os.write(fd, view)
+        while written < len(view):
+            written += os.write(fd, view[written:])
+    
+    def flush(self):
+        """Write out the records every thread has buffered"""
+        with self._buffers_lock:
+            buffers = list(self._buffers)
+        for buffer in buffers:
+            with buffer.lock:
+                if buffer.size:
+                    self._write_buffer(buffer)
+
+class _FlushingQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener that flushes its handlers once the queue has been idle for
+    LOG_FLUSH_INTERVAL, and before it stops, so buffered records reach disk
+    """
+    _pending = False
+    
+    def dequeue(self, block: bool):
+        while True:
+            try:
+                record = self.queue.get(block, LOG_FLUSH_INTERVAL if self._pending else None)
+            except queue.Empty:
+                self._flush_handlers()
+                continue
+            if record is self._sentinel:
+                self._flush_handlers()
+            else:
+                self._pending = True
+            return record
+    
+    def _flush_handlers(self):
+        for handler in self.handlers:
+            handler.flush()
+        self._pending = False
+
+class _LogPartition:
+    """One logger, log file and listener thread shared by every chat hashed to it"""
+    def __init__(self, index: int):
+        self.log_file = LOGS_DIR / f"langgraph_part_{index}_{_SESSION_ID}.txt"
         
         # Setup logger
-        self.logger = logging.getLogger(f"langgraph_{chat_id}")
-        self.logger.setLevel(logging.DEBUG)
+        self.logger = logging.getLogger(f"langgraph_part_{index}")
+        self.logger.setLevel(LOG_LEVEL)
         
         # Remove existing handlers
         for handler in self.logger.handlers[:]:
             self.logger.removeHandler(handler)
         
         # File handler
-        file_handler = logging.FileHandler(self.log_file, mode='w', encoding='utf-8')
+        file_handler = ThreadLocalBufferedFileHandler(self.log_file, mode='a', encoding='utf-8')
         file_handler.setLevel(logging.DEBUG)
         
         # Console handler
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
         
-        # Formatter
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
+        file_handler.setFormatter(_FORMATTER)
+        console_handler.setFormatter(_PayloadFormatter())
         
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        # Callers only enqueue; a listener thread formats and writes to both handlers
+        self._queue = queue.SimpleQueue()
+        self._listener = _FlushingQueueListener(
+            self._queue, file_handler, console_handler, respect_handler_level=True
+        )
+        self._handlers = [file_handler, console_handler]
+        self.logger.addHandler(_DeferredQueueHandler(self._queue))
+        # The listener's console handler already echoes records; don't repeat them via root
+        self.logger.propagate = False
+        self._listener.start()
+    
+    def close(self):
+        """Stop the listener once every queued record is written, then close handlers"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        handlers = self.logger.handlers
+        while handlers:
+            handlers.pop().close()
+        for handler in self._handlers:
+            handler.close()
+
+def _partition_index(chat_id: str) -> int:
+    # crc32 rather than hash() so a chat maps to the same files across restarts
+    return zlib.crc32(chat_id.encode("utf-8")) % LOG_PARTITIONS
+
+def _get_partition(chat_id: str) -> _LogPartition:
+    index = _partition_index(chat_id)
+    partition = _PARTITIONS[index]
+    if partition is None:
+        with _PARTITIONS_LOCK:
+            partition = _PARTITIONS[index]
+            if partition is None:
+                partition = _PARTITIONS[index] = _LogPartition(index)
+    return partition
+
+class _ChatLoggerAdapter(logging.LoggerAdapter):
+    """Tags records with the chat_id, keeping any extra the caller passes"""
+    def process(self, msg, kwargs):
+        extra = kwargs.get("extra")
+        kwargs["extra"] = self.extra if extra is None else {**self.extra, **extra}
+        return msg, kwargs
+
+class LangGraphLogger:
+    def __init__(self, chat_id: str):
+        self.chat_id = chat_id
+        partition = _get_partition(chat_id)
+        self.log_file = partition.log_file
+        self.logger = _ChatLoggerAdapter(partition.logger, {"chat_id": chat_id})
+    
+    def _log(self, level: int, message: str, data: Any = _NO_DATA):
+        """Log a message; a payload rides on the record and is serialized by the handler"""
+        if not self.logger.isEnabledFor(level):
+            return
+        if data is _NO_DATA:
+            self.logger.log(level, message)
+        else:
+            self.logger.log(level, message, extra={"payload": data})
     
     def log_node_start(self, node_name: str, input_data: Dict[str, Any]):
         """Log the start of a node execution"""
-        self.logger.info(f"=== Starting Node: {node_name} ===")
-        self.logger.debug(f"Input data: {json.dumps(input_data, indent=2, default=str)}")
+        self._log(logging.INFO, f"=== Starting Node: {node_name} ===")
+        self._log(logging.DEBUG, "Input data: ", input_data)
     
     def log_node_end(self, node_name: str, output_data: Dict[str, Any]):
         """Log the end of a node execution"""
-        self.logger.info(f"=== Completed Node: {node_name} ===")
-        self.logger.debug(f"Output data: {json.dumps(output_data, indent=2, default=str)}")
+        self._log(logging.INFO, f"=== Completed Node: {node_name} ===")
+        self._log(logging.DEBUG, "Output data: ", output_data)
     
     def log_intermediate_result(self, step_name: str, data: Any, details: str = ""):
         """Log intermediate results within a node"""
-        self.logger.info(f"Intermediate result - {step_name}: {details}")
-        if isinstance(data, (dict, list)):
-            self.logger.debug(f"Data: {json.dumps(data, indent=2, default=str)}")
+        self._log(logging.INFO, f"Intermediate result - {step_name}: {details}")
+        if isinstance(data, str):
+            # Often already JSON (e.g. raw LLM output); format it in as-is
+            self.logger.debug("Data: %s", data)
+        elif isinstance(data, bytes):
+            # Written to the file without re-encoding
+            self._log(logging.DEBUG, "Data: ", data)
+        elif isinstance(data, (dict, list)):
+            # Small containers stay on the JSON path too; repr would mix Python literals into the logs
+            self._log(logging.DEBUG, "Data: ", data)
         else:
-            self.logger.debug(f"Data: {str(data)}")
+            self._log(logging.DEBUG, f"Data: {str(data)}")
     
     def log_error(self, node_name: str, error: Exception, context: str = ""):
         """Log errors with context"""
-        self.logger.error(f"Error in {node_name}: {str(error)}")
+        self._log(logging.ERROR, f"Error in {node_name}: {str(error)}")
         if context:
-            self.logger.error(f"Context: {context}")
+            self._log(logging.ERROR, f"Context: {context}")
     
     def log_processing_stats(self, stats: Dict[str, Any]):
         """Log processing statistics"""
-        self.logger.info("=== Processing Statistics ===")
+        self._log(logging.INFO, "=== Processing Statistics ===")
         for key, value in stats.items():
-            self.logger.info(f"{key}: {value}")
+            self._log(logging.INFO, f"{key}: {value}")
     
     def close(self):
-        """Close logger handlers"""
-        for handler in self.logger.handlers[:]:
-            handler.close()
-            self.logger.removeHandler(handler)
+        """Nothing to release per chat; partitions stay open until the process exits"""
 
 
 def setup_langgraph_logger(chat_id: str) -> LangGraphLogger:
     """Setup and return a LangGraph logger for the chat session"""
     return LangGraphLogger(chat_id)
+
+
+def read_chat_log(chat_id: str) -> Optional[Tuple[str, str]]:
+    """
+    Collect a chat's records from the newest partition log that has any
+    
+    Returns:
+        Optional[Tuple[str, str]]: Log file name and the chat's log lines, or None.
+    """
+    log_files = sorted(
+        LOGS_DIR.glob(f"langgraph_part_{_partition_index(chat_id)}_*.txt"),
+        key=os.path.getctime,
+        reverse=True,
+    )
+    prefix = f"{chat_id} - "
+    for log_file in log_files:
+        lines = []
+        keep = False
+        with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                # Payload and traceback continuation lines belong to the preceding record
+                match = _RECORD_START.match(line)
+                if match:
+                    keep = line.startswith(prefix, match.end())
+                if keep:
+                    lines.append(line)
+        if lines:
+            return log_file.name, "".join(lines)
+    return None
+
+
+@atexit.register
+def _close_partitions():
+    """Drain every partition's queue before the interpreter exits"""
+    for partition in _PARTITIONS:
+        if partition is not None:
+            partition.close()